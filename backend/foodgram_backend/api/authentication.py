@@ -0,0 +1,139 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_KEY = 'auth-token:{}'
+# changed on every eviction of the token, a local entry is only used while
+# the revision it was cached with is still current
+REVISION_KEY = 'auth-token-revision:{}'
+# written on eviction so that a request which read the token before the
+# change cannot put it back into the shared cache, for about as long as
+# such a request may take
+EVICTED = False
+EVICTED_TIMEOUT = 10
+
+
+class TokenCache:
+    # Token key -> (user, token) in a per-process LRU with a TTL, in front
+    # of an optional shared cache. With the shared cache every local hit
+    # checks the token revision there, so evictions reach all processes at
+    # once. Without it other processes keep using their entries for up to
+    # TOKEN_CACHE_TTL after a logout or a password change.
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def shared(self):
+        if not settings.TOKEN_CACHE:
+            return None
+        return caches[settings.TOKEN_CACHE]
+
+    def get(self, key):
+        # returns the credentials and the revision to cache them with
+        shared = self.shared()
+        revision = None
+        if shared is not None:
+            revision = shared.get(REVISION_KEY.format(key))
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now and entry[2] == revision:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], revision
+            self.entries.pop(key, None)
+        credentials = None
+        if shared is not None:
+            credentials = shared.get(TOKEN_KEY.format(key)) or None
+        with self.lock:
+            if credentials is None:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+        if credentials is not None:
+            self.remember(key, credentials, revision)
+        return credentials, revision
+
+    def set(self, key, credentials, revision, generation):
+        # an eviction since generation was read may be about this token
+        if not self.remember(key, credentials, revision, generation):
+            return
+        shared = self.shared()
+        if shared is not None:
+            shared.add(TOKEN_KEY.format(key), credentials,
+                       timeout=settings.TOKEN_CACHE_SHARED_TTL)
+
+    def remember(self, key, credentials, revision, generation=None):
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self.entries[key] = (time.monotonic() + self.ttl, credentials,
+                                 revision)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return True
+
+    def evict(self, keys):
+        keys = set(keys)
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+        shared = self.shared()
+        if shared is not None and keys:
+            shared.set_many({TOKEN_KEY.format(key): EVICTED for key in keys},
+                            timeout=EVICTED_TIMEOUT)
+            # outlives every local entry cached with the previous revision
+            revision = time.time_ns()
+            shared.set_many({REVISION_KEY.format(key): revision
+                             for key in keys}, timeout=self.ttl)
+
+    def evict_user(self, user_id):
+        with self.lock:
+            keys = {key for key, (_, (user, _), _) in self.entries.items()
+                    if user.pk == user_id}
+        keys.update(Token.objects.filter(user_id=user_id).values_list(
+            'key', flat=True))
+        self.evict(keys)
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (round((self.hits + self.shared_hits) / requests,
+                                   4) if requests else None),
+            }
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # failed lookups are not cached, every request with a bad token still
+    # reaches the database
+    def authenticate_credentials(self, key):
+        credentials, revision = token_cache.get(key)
+        if credentials is None:
+            generation = token_cache.generation
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials, revision, generation)
+        user, token = credentials
+        # views and signal handlers keep state on request.user
+        return copy.copy(user), token
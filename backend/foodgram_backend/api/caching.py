@@ -0,0 +1,307 @@
+import gzip
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+CATALOG_VERSION_KEY = 'catalog-version:{}'
+CATALOG_RESPONSE_KEY = 'catalog-response:{}'
+USER_STATE_KEY = 'user-state:{}'
+AUTHOR_VERSION_KEY = 'author-version:{}'
+RESPONSE_KEY = 'response:{}'
+RESPONSE_LOCK_KEY = 'response-lock:{}'
+RESPONSE_TAG_KEY = 'response-tag:{}'
+# changes with every invalidation of a recipe or author tag
+RESPONSE_CONTENT_KEY = 'response-content'
+RESPONSE_WAIT_INTERVAL = 0.05
+
+
+def get_catalog_version(catalog):
+    key = CATALOG_VERSION_KEY.format(catalog)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_catalog_version(catalog):
+    cache.set(CATALOG_VERSION_KEY.format(catalog), time.time_ns(),
+              timeout=None)
+
+
+def get_user_state(user):
+    # changes whenever the user's favorites, cart or subscriptions do,
+    # which is what the per-user fields of recipe responses depend on
+    if not user.is_authenticated:
+        return None
+    key = USER_STATE_KEY.format(user.pk)
+    state = cache.get(key)
+    if state is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        state = cache.get(key)
+    return state
+
+
+def bump_user_state(user_ids):
+    now = time.time_ns()
+    cache.set_many({USER_STATE_KEY.format(pk): now for pk in user_ids},
+                   timeout=None)
+
+
+def get_author_versions(author_ids):
+    # changes whenever what recipe responses show of the author does; the
+    # versions are time_ns() of the change, or of the first lookup
+    keys = {AUTHOR_VERSION_KEY.format(pk): pk for pk in author_ids}
+    versions = get_versions(cache, list(keys))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_author_version(author_id):
+    cache.set(AUTHOR_VERSION_KEY.format(author_id), time.time_ns(),
+              timeout=None)
+
+
+def version_time(version):
+    return datetime.fromtimestamp(version / 10 ** 9, tz=timezone.utc)
+
+
+def response_cache():
+    if not settings.RESPONSE_CACHE:
+        return None
+    return caches[settings.RESPONSE_CACHE]
+
+
+def get_versions(backend, keys):
+    versions = backend.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            backend.add(key, now, timeout=None)
+        versions.update(backend.get_many(missing))
+    return versions
+
+
+def get_tag_versions(backend, tags):
+    return get_versions(
+        backend, [RESPONSE_TAG_KEY.format(tag) for tag in tags])
+
+
+def invalidate_responses(tags):
+    # Tags are either recipe:<id> and author:<id>, which are only known
+    # once a response is rendered, or the names of recipe sets that
+    # filters and orderings depend on.
+    backend = response_cache()
+    if backend is None or not tags:
+        return
+    now = time.time_ns()
+    versions = {RESPONSE_TAG_KEY.format(tag): now for tag in tags}
+    if any(':' in tag for tag in tags):
+        versions[RESPONSE_CONTENT_KEY] = now
+    backend.set_many(versions, timeout=None)
+
+
+def invalidate_responses_on_commit(tags):
+    tags = list(tags)
+    transaction.on_commit(lambda: invalidate_responses(tags))
+
+
+def conditional_response(request, validator, last_modified, view, *args,
+                         **kwargs):
+    user = request.user
+    etag = quote_etag(hashlib.sha1(':'.join(map(str, (
+        validator, user.pk, get_user_state(user),
+        get_catalog_version('tags'), get_catalog_version('ingredients'),
+    ))).encode()).hexdigest())
+    # Last-Modified does not cover per-user state, so it is only used
+    # for anonymous requests
+    timestamp = None
+    if last_modified is not None and not user.is_authenticated:
+        timestamp = int(last_modified.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = view(*args, **kwargs)
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags
+
+
+class CatalogCacheMixin:
+    # Reference data is served from pre-rendered, pre-compressed bytes
+    # keyed by the catalog version, which the signals in api.signals bump
+    # on every change. Authentication is skipped so that a revalidation
+    # answered with 304 does not touch the database at all.
+    catalog = None
+    authentication_classes = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, request, view, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return view(*args, **kwargs)
+        query = '&'.join(sorted(
+            f'{key}={value}' for key, values in request.query_params.lists()
+            for value in values))
+        digest = hashlib.sha1(
+            f'{get_catalog_version(self.catalog)}:{request.path}?{query}'
+            .encode()).hexdigest()
+        use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        etag = f'"{digest}-gzip"' if use_gzip else f'"{digest}"'
+
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            key = CATALOG_RESPONSE_KEY.format(digest)
+            cached = cache.get(key)
+            if cached is None:
+                response = view(*args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response.accepted_renderer = request.accepted_renderer
+                response.accepted_media_type = request.accepted_media_type
+                response.renderer_context = self.get_renderer_context()
+                content = response.rendered_content
+                cached = (content, gzip.compress(content, mtime=0),
+                          response['Content-Type'])
+                cache.set(key, cached,
+                          timeout=settings.CATALOG_CACHE_TIMEOUT)
+            content, compressed, content_type = cached
+            response = HttpResponse(
+                compressed if use_gzip else content,
+                content_type=content_type)
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class AnonymousCacheMixin:
+    # Rendered responses for anonymous users are kept in the response
+    # cache together with the versions of the tags returned by
+    # get_response_tags(), the signals in api.signals bump those versions.
+    # Only one request renders a missing or stale entry, the others wait
+    # for it.
+    def get_response_tags(self, data):
+        raise NotImplementedError
+
+    def get_prefetch_tags(self, request):
+        return []
+
+    def anonymous_cached(self, request, view, *args, **kwargs):
+        backend = response_cache()
+        if (backend is None or request.method != 'GET'
+                or request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return view(*args, **kwargs)
+        query = '&'.join(sorted({
+            f'{key}={value}' for key, values in request.query_params.lists()
+            for value in values if value
+        }))
+        digest = hashlib.sha1(':'.join(map(str, (
+            request.scheme, request.get_host(), request.path, query,
+            get_catalog_version('tags'), get_catalog_version('ingredients'),
+        ))).encode()).hexdigest()
+        key = RESPONSE_KEY.format(digest)
+        entry = self.fresh_entry(backend, key)
+        if entry is None:
+            lock = RESPONSE_LOCK_KEY.format(digest)
+            if backend.add(lock, True,
+                           timeout=settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+                try:
+                    response, entry = self.render_entry(
+                        backend, request, view, *args, **kwargs)
+                    if entry is not None:
+                        backend.set(key, entry,
+                                    timeout=settings.RESPONSE_CACHE_TIMEOUT)
+                finally:
+                    backend.delete(lock)
+                if entry is None:
+                    return response
+            else:
+                entry = self.wait_for_entry(backend, key, lock)
+                if entry is None:
+                    return view(*args, **kwargs)
+        return self.entry_response(request, entry)
+
+    def fresh_entry(self, backend, key):
+        entry = backend.get(key)
+        if entry is None:
+            return None
+        versions = get_versions(backend, list(entry['versions']))
+        if versions != entry['versions']:
+            return None
+        return entry
+
+    def wait_for_entry(self, backend, key, lock):
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(RESPONSE_WAIT_INTERVAL)
+            entry = self.fresh_entry(backend, key)
+            if entry is not None or backend.get(lock) is None:
+                return entry
+        return None
+
+    def render_entry(self, backend, request, view, *args, **kwargs):
+        versions = get_tag_versions(backend, self.get_prefetch_tags(request))
+        content_version = get_versions(
+            backend, [RESPONSE_CONTENT_KEY])[RESPONSE_CONTENT_KEY]
+        response = view(*args, **kwargs)
+        if response.status_code != 200:
+            return response, None
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        content = response.rendered_content
+        versions.update(get_tag_versions(
+            backend, self.get_response_tags(response.data)))
+        # a recipe changed while the response was rendered may not be
+        # covered by the versions read after rendering
+        if backend.get(RESPONSE_CONTENT_KEY) != content_version:
+            return response, None
+        return response, {
+            'versions': versions,
+            'content': content,
+            'content_type': response['Content-Type'],
+            'etag': response.get('ETag'),
+            'last_modified': parse_http_date_safe(
+                response.get('Last-Modified', '')),
+        }
+
+    def entry_response(self, request, entry):
+        response = get_conditional_response(
+            request, etag=entry['etag'],
+            last_modified=entry['last_modified'])
+        if response is None:
+            response = HttpResponse(entry['content'],
+                                    content_type=entry['content_type'])
+        if entry['etag']:
+            response['ETag'] = entry['etag']
+        if entry['last_modified'] is not None:
+            response['Last-Modified'] = http_date(entry['last_modified'])
+        return response
@@ -0,0 +1,134 @@
+import csv
+import io
+import os
+from functools import lru_cache
+from itertools import chain
+
+from django.conf import settings
+
+from recipes.models import ShoppingCartItem
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+PDF_FONT = 'FoodgramSans'
+MARGIN = 50
+FONT_SIZE = 11
+LEADING = 16
+# space between a name and its amount
+AMOUNT_GAP = 10
+
+
+def shopping_cart_items(user):
+    return ShoppingCartItem.objects.filter(user=user).values(
+        'ingredient__name', 'ingredient__measurement_unit', 'total'
+    ).order_by('ingredient__name').iterator()
+
+
+def text_lines(items):
+    for item in items:
+        name = item['ingredient__name']
+        unit = item['ingredient__measurement_unit']
+        total = str(item['total'])
+        dots = '.' * (80 - len(name + unit + total))
+        yield f'• {name}({unit}):{dots}{total}\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['ингредиент', 'единица измерения', 'количество'])
+    for item in items:
+        yield writer.writerow([item['ingredient__name'],
+                               item['ingredient__measurement_unit'],
+                               item['total']])
+
+
+def pdf_available():
+    return canvas is not None and os.path.isfile(
+        settings.SHOPPING_CART_PDF_FONT)
+
+
+@lru_cache(maxsize=None)
+def pdf_font(path):
+    # reportlab embeds a subset with only the glyphs the document uses
+    pdfmetrics.registerFont(TTFont(PDF_FONT, path))
+    return PDF_FONT
+
+
+def wrap(text, font, width):
+    # simpleSplit breaks lines on spaces only, a word that is still too
+    # long is cut wherever it reaches the width
+    for line in simpleSplit(text, font, FONT_SIZE, width) or ['']:
+        while stringWidth(line, font, FONT_SIZE) > width and len(line) > 1:
+            cut = len(line) - 1
+            while cut > 1 and stringWidth(
+                    line[:cut], font, FONT_SIZE) > width:
+                cut -= 1
+            yield line[:cut]
+            line = line[cut:]
+        yield line
+
+
+def pdf_lines(lines, font, width):
+    # the amount goes on the last line of its name, which is wrapped
+    # to leave room for it
+    for left, right in lines:
+        room = width - stringWidth(right, font, FONT_SIZE) - AMOUNT_GAP
+        wrapped = list(wrap(left, font, room))
+        for text in wrapped[:-1]:
+            yield text, ''
+        yield wrapped[-1], right
+
+
+def render_pdf(title, lines):
+    font = pdf_font(settings.SHOPPING_CART_PDF_FONT)
+    page_width, page_height = A4
+    output = io.BytesIO()
+    pdf = canvas.Canvas(output, pagesize=A4, pageCompression=1)
+    pdf.setTitle(title)
+    pdf.setFont(font, FONT_SIZE)
+    top = page_height - MARGIN
+    y = top
+    lines = chain([(title, ''), ('', '')],
+                  pdf_lines(lines, font, page_width - 2 * MARGIN))
+    for left, right in lines:
+        if y < MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, FONT_SIZE)
+            y = top
+        pdf.drawString(MARGIN, y, left)
+        if right:
+            pdf.drawRightString(page_width - MARGIN, y, right)
+        y -= LEADING
+    pdf.save()
+    return output.getvalue()
+
+
+def pdf_chunks(items):
+    lines = (
+        (f'• {item["ingredient__name"]} '
+         f'({item["ingredient__measurement_unit"]})',
+         str(item['total']))
+        for item in items
+    )
+    # the canvas writes the file out only once all pages are drawn
+    yield render_pdf('Список покупок', lines)
+
+
+EXPORTERS = {
+    'txt': (text_lines, 'text/plain; charset=utf-8', 'shopping_cart.txt'),
+    'csv': (csv_lines, 'text/csv; charset=utf-8', 'shopping_cart.csv'),
+    'pdf': (pdf_chunks, 'application/pdf', 'shopping_cart.pdf'),
+}
@@ -1,13 +1,76 @@
-import base64
+import binascii
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import Image, UnidentifiedImageError
 from rest_framework import serializers
 
+# multiple of 4 so that every chunk decodes on its own
+DECODE_CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+
+
+def decode_base64(imgstr, name, content_type, max_bytes):
+    # the upper bound of the decoded size is known from the length alone,
+    # so oversized payloads are rejected before anything is decoded
+    if len(imgstr) // 4 * 3 > max_bytes + 2:
+        raise serializers.ValidationError(
+            f'Размер изображения превышает {max_bytes} байт.')
+    buffer = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        for start in range(0, len(imgstr), DECODE_CHUNK_SIZE):
+            buffer.write(binascii.a2b_base64(
+                imgstr[start:start + DECODE_CHUNK_SIZE]))
+    except binascii.Error:
+        buffer.close()
+        raise serializers.ValidationError('Некорректная кодировка base64.')
+    size = buffer.tell()
+    buffer.seek(0)
+    return InMemoryUploadedFile(buffer, None, name, content_type, size, None)
+
+
+def check_dimensions(data, max_pixels):
+    # only the header is parsed here, pixel data is never loaded
+    try:
+        with Image.open(data) as image:
+            width, height = image.size
+    except UnidentifiedImageError:
+        # reported by ImageField itself
+        return
+    except Image.DecompressionBombError:
+        width, height = max_pixels + 1, 1
+    finally:
+        data.seek(0)
+    if width * height > max_pixels:
+        raise serializers.ValidationError(
+            f'Изображение больше {max_pixels} пикселей.')
+
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
+            content_type = format.split(':')[-1]
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_base64(imgstr, 'temp.' + ext, content_type,
+                                 settings.RECIPE_IMAGE_MAX_BYTES)
+        elif getattr(data, 'size', 0) > settings.RECIPE_IMAGE_MAX_BYTES:
+            raise serializers.ValidationError(
+                'Размер изображения превышает '
+                f'{settings.RECIPE_IMAGE_MAX_BYTES} байт.')
+        if hasattr(data, 'seek'):
+            check_dimensions(data, settings.RECIPE_IMAGE_MAX_PIXELS)
         return super().to_internal_value(data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Only the type of the key is checked here; the parent serializer
+    # resolves all keys of a request with a single in_bulk() query.
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
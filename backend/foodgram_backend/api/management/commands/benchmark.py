@@ -0,0 +1,160 @@
+import json
+import time
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import (CaptureQueriesContext,
+                               setup_test_environment)
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Tag
+
+User = get_user_model()
+
+# maximum number of SQL queries per request, independent of the dataset
+QUERY_BUDGETS = {
+    'recipes_list': 6,
+    'recipes_list_anonymous': 5,
+    'recipes_list_tags': 6,
+    'recipes_list_favorited': 6,
+    'recipes_search': 6,
+    'recipes_feed': 6,
+    'recipe_detail': 5,
+    'subscriptions': 4,
+    'ingredients_search': 1,
+    'download_shopping_cart': 1,
+}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время ответа и число SQL-запросов основных эндпоинтов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--user', type=int, default=None,
+                            help='id пользователя, от имени которого '
+                                 'выполняются запросы')
+        parser.add_argument('--output', default=None)
+        parser.add_argument('--compare', default=None,
+                            help='JSON с результатами предыдущего запуска')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        user = self.get_user(options['user'])
+        recipe = Recipe.objects.annotate(
+            favorites=Count('favored_by')).order_by('-favorites').first()
+        if recipe is None:
+            raise CommandError('нет рецептов, сначала выполните '
+                               'generatedata')
+        tags = '&'.join(f'tags={slug}' for slug in
+                        Tag.objects.values_list('slug', flat=True)[:2])
+        endpoints = {
+            'recipes_list': '/api/recipes/',
+            'recipes_list_anonymous': '/api/recipes/',
+            'recipes_list_tags': f'/api/recipes/?{tags}',
+            'recipes_list_favorited': '/api/recipes/?is_favorited=1',
+            'recipes_search': '/api/recipes/?search=суп',
+            'recipes_feed': '/api/recipes/feed/',
+            'recipe_detail': f'/api/recipes/{recipe.pk}/',
+            'subscriptions': '/api/users/subscriptions/?recipes_limit=3',
+            'ingredients_search': '/api/ingredients/?name=ка',
+            'download_shopping_cart': '/api/recipes/download_shopping_cart/',
+        }
+        client = APIClient()
+        client.force_authenticate(user)
+        anonymous = APIClient()
+
+        results = {}
+        for name, url in endpoints.items():
+            results[name] = self.measure(
+                anonymous if name.endswith('_anonymous') else client,
+                url, options['iterations'])
+            results[name]['query_budget'] = QUERY_BUDGETS[name]
+            self.stdout.write(
+                f'{name:<26} p50 {results[name]["p50_ms"]:8.2f} ms  '
+                f'p95 {results[name]["p95_ms"]:8.2f} ms  '
+                f'{results[name]["queries"]:3} queries  '
+                f'{results[name]["bytes"]:9} bytes')
+
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'user': user.pk,
+            'iterations': options['iterations'],
+            'endpoints': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2)
+        if options['compare']:
+            self.compare(results, options['compare'])
+
+        violations = [
+            f'{name}: {result["queries"]} > {result["query_budget"]}'
+            for name, result in results.items()
+            if result['queries'] > result['query_budget']
+        ]
+        errors = [f'{name}: HTTP {result["status"]}'
+                  for name, result in results.items()
+                  if result['status'] >= 400]
+        if violations or errors:
+            raise CommandError(
+                'превышен бюджет запросов или получена ошибка:\n'
+                + '\n'.join(violations + errors))
+
+    def get_user(self, pk):
+        if pk is not None:
+            return User.objects.get(pk=pk)
+        user = User.objects.annotate(
+            cart=Count('shopping_cart', distinct=True),
+            follows=Count('subscriptions', distinct=True),
+        ).order_by('-cart', '-follows').first()
+        if user is None:
+            raise CommandError('нет пользователей, сначала выполните '
+                               'generatedata')
+        return user
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            return response, sum(len(chunk)
+                                 for chunk in response.streaming_content)
+        return response, len(response.content)
+
+    def measure(self, client, url, iterations):
+        self.request(client, url)
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                response, size = self.request(client, url)
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'url': url,
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'queries': len(queries),
+            'bytes': size,
+        }
+
+    def compare(self, results, path):
+        with open(path, encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)['endpoints']
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            before = previous[name]
+            self.stdout.write(
+                f'{name:<26} p50 {before["p50_ms"]:8.2f} -> '
+                f'{result["p50_ms"]:8.2f} ms  queries '
+                f'{before["queries"]} -> {result["queries"]}')
@@ -0,0 +1,73 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import IngredientSerializer
+from recipes.models import Ingredient
+from .benchmark import Command as EndpointsCommand, percentile
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время кодирования и пиковую память JSONRenderer '
+            'и FastJSONRenderer на самых больших ответах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--user', type=int, default=None,
+                            help='id пользователя, от имени которого '
+                                 'запрашиваются ответы')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        client = APIClient()
+        client.force_authenticate(
+            EndpointsCommand().get_user(options['user']))
+        payloads = {
+            'ingredient_catalog': IngredientSerializer(
+                Ingredient.objects.all(), many=True).data,
+        }
+        for name, url in (
+            ('recipes_page_200', '/api/recipes/?limit=200'),
+            ('subscriptions_page_100',
+             '/api/users/subscriptions/?limit=100&recipes_limit=10'),
+        ):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: HTTP {response.status_code}')
+            payloads[name] = response.data
+
+        self.stdout.write('fast encoder: '
+                          + ('orjson' if orjson is not None else 'json'))
+        renderers = {'json': JSONRenderer(), 'fast': FastJSONRenderer()}
+        for name, data in payloads.items():
+            results = {
+                label: self.measure(renderer, data, options['iterations'])
+                for label, renderer in renderers.items()
+            }
+            identical = results['json'][0] == results['fast'][0]
+            self.stdout.write(
+                f'{name:<24} {len(results["json"][0]):9} bytes  '
+                + '  '.join(
+                    f'{label} p50 {p50:7.2f} ms peak {peak / 1024:8.0f} KiB'
+                    for label, (_, p50, peak) in results.items())
+                + f'  x{results["json"][1] / results["fast"][1]:.1f}'
+                + ('' if identical else '  ОТЛИЧАЕТСЯ'))
+
+    def measure(self, renderer, data, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            content = renderer.render(data)
+            timings.append((time.perf_counter() - started) * 1000)
+        tracemalloc.start()
+        try:
+            renderer.render(data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return content, percentile(timings, 0.5), peak
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext,
+                               setup_test_environment)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.representations import recipe_rows, represent_recipes
+from api.views import RecipeViewSet
+from .benchmark import Command as EndpointsCommand, percentile
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает RecipeSerializer и представление из values() '
+            'на страницах разного размера')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='6,50,200')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--user', type=int, default=None,
+                            help='id пользователя, от имени которого '
+                                 'строятся ответы')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        user = EndpointsCommand().get_user(options['user'])
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        view = RecipeViewSet(request=request, action='list',
+                             format_kwarg=None, args=(), kwargs={})
+        queryset = view.get_queryset()
+        renderer = JSONRenderer()
+
+        def serializer_page(size):
+            serializer = view.get_serializer(queryset[:size], many=True)
+            return renderer.render(serializer.data)
+
+        def rows_page(size):
+            return renderer.render(represent_recipes(
+                recipe_rows(queryset)[:size], request, thumbnails=True))
+
+        for size in map(int, options['sizes'].split(',')):
+            expected = serializer_page(size)
+            if rows_page(size) != expected:
+                raise CommandError(
+                    f'ответы различаются на странице из {size} рецептов')
+            results = {
+                name: self.measure(build, size, options['iterations'])
+                for name, build in (('serializer', serializer_page),
+                                    ('values', rows_page))
+            }
+            self.stdout.write(
+                f'{size:4} recipes {len(expected):9} bytes  ' + '  '.join(
+                    f'{name} p50 {p50:8.2f} ms {queries} queries'
+                    for name, (p50, queries) in results.items())
+                + f'  x{results["serializer"][0] / results["values"][0]:.1f}')
+
+    def measure(self, build, size, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                build(size)
+            timings.append((time.perf_counter() - started) * 1000)
+        return percentile(timings, 0.5), len(queries)
@@ -0,0 +1,125 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger('foodgram.performance')
+# timer of the request being handled, None outside the middleware
+current_timer = ContextVar('current_timer', default=None)
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.serialization = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+@contextmanager
+def serialization():
+    # Time spent building response data, without the queries it runs.
+    # Nested calls, such as a serializer used by a method field, count once.
+    timer = current_timer.get()
+    if timer is None or timer.serializing:
+        yield
+        return
+    timer.serializing = True
+    started = time.perf_counter()
+    db = timer.duration
+    try:
+        yield
+    finally:
+        timer.serializing = False
+        timer.serialization += (time.perf_counter() - started
+                                - (timer.duration - db))
+
+
+def timed_data(data):
+    def get_data(self):
+        with serialization():
+            return data.fget(self)
+    get_data.timed = True
+    return property(get_data)
+
+
+# Server-Timing splits a request into SQL, serialization (the .data of DRF
+# serializers and represent_recipes), response rendering and "view" for the
+# rest. Streamed responses, such as the shopping cart export, run their
+# queries after the middleware has returned, so their SQL and the time
+# spent streaming are not in the header or in the slow request log.
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not getattr(BaseSerializer.data.fget, 'timed', False):
+            BaseSerializer.data = timed_data(BaseSerializer.data)
+
+    def __call__(self, request):
+        request.timing_view = None
+        request.timing_render_started = None
+        queries = QueryTimer()
+        token = current_timer.set(queries)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        finished = time.perf_counter()
+
+        total = (finished - started) * 1000
+        db = queries.duration * 1000
+        serialize = queries.serialization * 1000
+        render = 0.0
+        if request.timing_render_started is not None:
+            render = (finished - request.timing_render_started) * 1000
+        response['Server-Timing'] = ', '.join((
+            f'db;desc="{queries.count} queries";dur={db:.2f}',
+            f'serialize;dur={serialize:.2f}',
+            f'view;dur={max(total - db - serialize - render, 0):.2f}',
+            f'render;dur={render:.2f}',
+            f'total;dur={total:.2f}',
+        ))
+        if total >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            view, action = request.timing_view or (None, None)
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'view': view,
+                'action': action,
+                'total_ms': round(total, 2),
+                'db_ms': round(db, 2),
+                'queries': queries.count,
+                'serialize_ms': round(serialize, 2),
+                'render_ms': round(render, 2),
+            }, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        actions = getattr(view_func, 'actions', None) or {}
+        if view_class is not None:
+            request.timing_view = (
+                view_class.__name__, actions.get(request.method.lower()))
+        else:
+            request.timing_view = (
+                getattr(view_func, '__qualname__', repr(view_func)), None)
+
+    def process_template_response(self, request, response):
+        request.timing_render_started = time.perf_counter()
+        return response
@@ -1,7 +1,80 @@
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+
+
+class FeedCursorPagination(pagination.CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        if hasattr(view, 'get_feed_ordering'):
+            return view.get_feed_ordering()
+        return super().get_ordering(request, queryset, view)
+
+
+class TimelinePagination(FeedCursorPagination):
+    # Forward-only keyset pagination over a list of recipe ids, newest
+    # first. The cursor holds the last id of the previous page.
+    def paginate_ids(self, request, load_ids):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        before = None
+        if cursor is not None and cursor.position is not None:
+            try:
+                before = int(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        ids = load_ids(before, self.page_size + 1)
+        self.has_next = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+        self.next_position = ids[-1] if ids else None
+        return ids
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(pagination.Cursor(
+            offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        return None
 
 
 class CustomPagination(pagination.PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
     page_query_param = 'page'
+    cursor_pagination_class = FeedCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # ?cursor= switches to keyset pagination, which skips COUNT(*) and
+        # OFFSET; page/limit keep working as before
+        self.cursor_paginator = None
+        if self.cursor_pagination_class.cursor_query_param in \
+                request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def page_state(self):
+        # everything but the results that goes into the paginated response
+        if self.cursor_paginator is not None:
+            return (self.cursor_paginator.get_next_link(),
+                    self.cursor_paginator.get_previous_link())
+        return (self.page.paginator.count, self.get_next_link(),
+                self.get_previous_link())
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response_schema(
+                schema)
+        return super().get_paginated_response_schema(schema)
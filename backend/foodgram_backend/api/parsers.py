@@ -0,0 +1,37 @@
+import codecs
+import re
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework import parsers
+
+from .renderers import FastJSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson turns integers beyond 64 bits into floats, json keeps them exact
+LONG_NUMBER = re.compile(rb'\d{20}')
+
+
+class FastJSONParser(parsers.JSONParser):
+    # orjson when it is installed, JSONParser for other encodings,
+    # non-strict parsing, long numbers and for the error message of a
+    # rejected body
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding',
+                                              settings.DEFAULT_CHARSET)
+        if (orjson is None or not self.strict
+                or codecs.lookup(encoding).name != 'utf-8'):
+            return super().parse(stream, media_type, parser_context)
+        content = stream.read()
+        if not LONG_NUMBER.search(content):
+            try:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(BytesIO(content), media_type, parser_context)
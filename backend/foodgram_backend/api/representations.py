@@ -0,0 +1,112 @@
+from collections import defaultdict
+from operator import itemgetter
+
+from django.core.files.storage import default_storage
+
+from recipes.images import srcset, thumbnail_path
+from recipes.models import IngredientInRecipe, Recipe
+from .middleware import serialization
+
+# Read-only path for recipe lists and details: the same JSON as
+# RecipeSerializer, built from values() rows instead of model instances
+# and serializer fields. Keep both in step when a field changes.
+RECIPE_FIELDS = ('id', 'name', 'text', 'cooking_time', 'image',
+                 'image_variants', 'image_status', 'favorites_count',
+                 'author_id', 'author__email', 'author__username',
+                 'author__first_name', 'author__last_name', 'updated_at')
+RELATED_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+TAG_FIELDS = ('recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug')
+INGREDIENT_FIELDS = ('recipe_id', 'ingredient_id', 'ingredient__name',
+                     'ingredient__measurement_unit', 'amount')
+# the order the serializers use, see RecipeViewSet.get_queryset
+TAGS_ORDERING = 'tag_id'
+INGREDIENTS_ORDERING = 'pk'
+
+
+def media_url(request, path):
+    url = default_storage.url(path)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def recipe_rows(queryset):
+    # annotations such as search_rank are kept for cursor pagination
+    return queryset.prefetch_related(None).values(
+        *RECIPE_FIELDS, *queryset.query.annotations)
+
+
+def user_subscriptions(request):
+    user = request.user
+    if not user.is_authenticated:
+        return set()
+    return set(user.subscriptions.values_list('pk', flat=True))
+
+
+def group_by_recipe(rows, build):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[0]].append(build(row))
+    return grouped
+
+
+def represent_recipes(rows, request, thumbnails=False):
+    with serialization():
+        return build_recipes(rows, request, thumbnails)
+
+
+def build_recipes(rows, request, thumbnails):
+    rows = list(rows)
+    recipe_ids = [row['id'] for row in rows]
+    tags = group_by_recipe(
+        Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by(TAGS_ORDERING).values_list(*TAG_FIELDS),
+        lambda row: {'id': row[1], 'name': row[2], 'color': row[3],
+                     'slug': row[4]})
+    ingredients = group_by_recipe(
+        IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by(INGREDIENTS_ORDERING).values_list(*INGREDIENT_FIELDS),
+        lambda row: {'id': row[1], 'name': row[2],
+                     'measurement_unit': row[3], 'amount': row[4]})
+    subscriptions = user_subscriptions(request) if rows else set()
+    related = itemgetter(*RELATED_FIELDS)
+
+    def build_url(path):
+        return media_url(request, path)
+
+    data = []
+    for row in rows:
+        image = build_url(row['image']) if row['image'] else None
+        image_srcset = None
+        if row['image_status'] == Recipe.IMAGE_READY:
+            variants = row['image_variants']
+            if thumbnails:
+                path = thumbnail_path(variants)
+                if path is not None:
+                    image = build_url(path)
+            if variants:
+                image_srcset = srcset(variants, build_url)
+        is_favorited, is_in_shopping_cart = related(row)
+        data.append({
+            'id': row['id'],
+            'ingredients': ingredients[row['id']],
+            'image': image,
+            'image_srcset': image_srcset,
+            'name': row['name'],
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+            'tags': tags[row['id']],
+            'author': {
+                'email': row['author__email'],
+                'id': row['author_id'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'is_subscribed': row['author_id'] in subscriptions,
+            },
+            'is_favorited': is_favorited,
+            'is_in_shopping_cart': is_in_shopping_cart,
+        })
+    return data
@@ -1,23 +1,35 @@
+from collections import Counter
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 
-from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
-from .fields import Base64ImageField
+from recipes.carts import recipe_ingredients_changed
+from recipes.images import srcset, thumbnail_path
+from recipes.models import (ImageTask, Ingredient, IngredientInRecipe,
+                            Recipe, Tag)
+from recipes.workers import enqueue
+from .fields import Base64ImageField, BulkPrimaryKeyRelatedField
+from .representations import media_url
 
 
 User = get_user_model()
 
 
 class UserSubscribedMixin:
+    def get_subscriptions(self):
+        if 'subscriptions' not in self.context:
+            user = self.context['request'].user
+            self.context['subscriptions'] = set(
+                user.subscriptions.values_list('pk', flat=True)
+            ) if user.is_authenticated else set()
+        return self.context['subscriptions']
+
     def check_subscription(self, author):
-        user_id = self.context['request'].user.id
-        if not bool(user_id):
-            return False
-        try:
-            user = User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return False
-        return user.subscriptions.filter(pk=author.pk).exists()
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
+        return author.pk in self.get_subscriptions()
 
 
 class UserSerializer(serializers.ModelSerializer, UserSubscribedMixin):
@@ -59,9 +71,14 @@ class UserWithRecipesSerializer(serializers.ModelSerializer,
                   )
 
     def count_recipes(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'recipes_preview'):
+            return RecipesMinifiedSerializer(
+                obj.recipes_preview, many=True, read_only=True).data
         recipes_limit = self.context['request'].GET.get('recipes_limit', None)
         if recipes_limit:
             recipes_limit = int(recipes_limit)
@@ -105,7 +122,7 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         source='ingredient',
         queryset=Ingredient.objects.all(),
         required=True,
@@ -123,22 +140,51 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipesMinifiedSerializer(serializers.ModelSerializer):
+class RecipeImageMixin:
+    # Lists only need a small picture: ``image`` points to the smallest
+    # variant there, the full set is available through ``image_srcset``.
+    thumbnails = False
+
+    def build_image_url(self, path):
+        return media_url(self.context.get('request'), path)
+
+    def get_image_srcset(self, obj):
+        if obj.image_status != Recipe.IMAGE_READY or not obj.image_variants:
+            return None
+        return srcset(obj.image_variants, self.build_image_url)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if (instance.image_status == Recipe.IMAGE_READY
+                and (self.thumbnails or self.context.get('thumbnails'))):
+            path = thumbnail_path(instance.image_variants)
+            if path is not None:
+                data['image'] = self.build_image_url(path)
+        return data
+
+
+class RecipesMinifiedSerializer(RecipeImageMixin,
+                                serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
+    thumbnails = True
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_srcset',
             'cooking_time'
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(RecipeImageMixin, serializers.ModelSerializer):
     ingredients = IngredientInRecipeSerializer(many=True,
                                                read_only=False,
                                                required=True)
     image = Base64ImageField(required=False, allow_null=True)
+    image_srcset = serializers.SerializerMethodField()
     tags = TagSerializer(many=True,
                          read_only=True)
     author = UserSerializer(many=False, read_only=True)
@@ -149,57 +195,128 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ['id', 'ingredients', 'image', 'name', 'text',
-                  'cooking_time', 'tags', 'author', 'is_favorited',
+        fields = ['id', 'ingredients', 'image', 'image_srcset', 'name',
+                  'text', 'cooking_time', 'tags', 'author', 'is_favorited',
                   'is_in_shopping_cart']
         depth = 1
 
-    def check_favorites(self, obj):
-        user_id = self.context['request'].user.id
-        if not bool(user_id):
-            return False
-        try:
-            user = User.objects.get(pk=user_id)
-        except User.DoesNotExist:
+    def check_related(self, obj, annotation, related_name):
+        if hasattr(obj, annotation):
+            return getattr(obj, annotation)
+        user = self.context['request'].user
+        if not user.is_authenticated:
             return False
-        return user.favorite_recipes.filter(pk=obj.pk).exists()
+        return getattr(user, related_name).filter(pk=obj.pk).exists()
+
+    def check_favorites(self, obj):
+        return self.check_related(obj, 'is_favorited', 'favorite_recipes')
 
     def check_in_shopping_cart(self, obj):
-        user_id = self.context['request'].user.id
-        if not bool(user_id):
-            return False
-        try:
-            user = User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return False
-        return user.shopping_cart.filter(pk=obj.pk).exists()
+        return self.check_related(obj, 'is_in_shopping_cart',
+                                  'shopping_cart')
 
 
 class RecipeCreateSerializer(RecipeSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True,
         required=True,
         queryset=Tag.objects.all()
     )
 
+    def resolve_ids(self, model, ids, label):
+        duplicates = sorted(pk for pk, count in Counter(ids).items()
+                            if count > 1)
+        if duplicates:
+            raise serializers.ValidationError(
+                f'{label} указаны несколько раз: '
+                f'{", ".join(map(str, duplicates))}')
+        objects = model.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            raise serializers.ValidationError(
+                f'{label} не найдены: {", ".join(map(str, missing))}')
+        return objects
+
+    def validate_tags(self, tag_ids):
+        tags = self.resolve_ids(Tag, tag_ids, 'теги')
+        return [tags[pk] for pk in tag_ids]
+
+    def validate_ingredients(self, ingredients_data):
+        ingredients = self.resolve_ids(
+            Ingredient, [data['ingredient'] for data in ingredients_data],
+            'ингредиенты')
+        for data in ingredients_data:
+            data['ingredient'] = ingredients[data['ingredient']]
+        return ingredients_data
+
+    def update_ingredients(self, recipe, ingredients_data):
+        # only rows that actually change are touched
+        existing = {
+            item.ingredient_id: item
+            for item in recipe.ingredients.select_for_update()
+        }
+        old_amounts = {ingredient_id: item.amount
+                       for ingredient_id, item in existing.items()}
+        amounts = {data['ingredient'].pk: data['amount']
+                   for data in ingredients_data}
+        removed = [item.pk for ingredient_id, item in existing.items()
+                   if ingredient_id not in amounts]
+        changed = []
+        added = []
+        for ingredient_id, amount in amounts.items():
+            item = existing.get(ingredient_id)
+            if item is None:
+                added.append(IngredientInRecipe(
+                    recipe=recipe, ingredient_id=ingredient_id,
+                    amount=amount))
+            elif item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        if removed:
+            IngredientInRecipe.objects.filter(pk__in=removed).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        if added:
+            IngredientInRecipe.objects.bulk_create(added)
+        recipe_ingredients_changed(recipe.pk, old_amounts, amounts)
+
     def save_recipe(self, validated_data, instance=None):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        if instance:
-            recipe = super().update(instance, validated_data)
-            recipe.ingredients.all().delete()
-        else:
-            recipe = Recipe.objects.create(**validated_data)
-
-        ingredients = [IngredientInRecipe(**data, recipe=recipe)
-                       for data in ingredients_data]
-        IngredientInRecipe.objects.bulk_create(ingredients)
-        recipe.tags.set(tags)
+        image_changed = 'image' in validated_data
+        if image_changed:
+            # variants are built off the request, until then clients get
+            # the original image only
+            validated_data['image_status'] = Recipe.IMAGE_PENDING
+        with transaction.atomic():
+            if instance:
+                self.update_ingredients(instance, ingredients_data)
+                recipe = instance
+            else:
+                recipe = Recipe.objects.create(**validated_data)
+                IngredientInRecipe.objects.bulk_create(
+                    IngredientInRecipe(**data, recipe=recipe)
+                    for data in ingredients_data)
+            recipe.tags.set(tags)
+            if instance:
+                # saved last so updated_at covers the ingredient and tag
+                # changes
+                recipe = super().update(instance, validated_data)
+            if image_changed:
+                enqueue(ImageTask, recipe)
         return recipe
 
     def create(self, validated_data):
         return self.save_recipe(validated_data)
 
+    def to_representation(self, instance):
+        # the saved recipe comes back without the prefetches of the list
+        # and detail views
+        prefetch_related_objects([instance], Prefetch(
+            'ingredients',
+            queryset=IngredientInRecipe.objects.select_related('ingredient')))
+        return super().to_representation(instance)
+
     def update(self, instance, validated_data):
         return self.save_recipe(validated_data,
                                 instance)
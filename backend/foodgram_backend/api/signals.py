@@ -0,0 +1,137 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from .authentication import token_cache
+from .caching import (bump_author_version, bump_catalog_version,
+                      bump_user_state, invalidate_responses_on_commit,
+                      response_cache)
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_catalog_version('tags'))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    # registered after the catalog rebuild in recipes.signals, so the
+    # new version is never paired with the old catalog file
+    transaction.on_commit(lambda: bump_catalog_version('ingredients'))
+
+
+@receiver(m2m_changed, sender=User.favorite_recipes.through)
+@receiver(m2m_changed, sender=User.shopping_cart.through)
+@receiver(m2m_changed, sender=User.subscriptions.through)
+def bump_users_state(sender, instance, action, reverse, pk_set,
+                     **kwargs):
+    if not action.startswith('post_'):
+        return
+    user_ids = list(pk_set or ()) if reverse else [instance.pk]
+    transaction.on_commit(lambda: bump_user_state(user_ids))
+
+
+# Anonymous recipe responses, see AnonymousCacheMixin. recipe:<id> and
+# author:<id> cover what a response shows, the recipe-* tags which recipes
+# a filtered or ordered list contains.
+RECIPE_SET_FIELDS = {'author': 'recipe-list', 'name': 'recipe-text',
+                     'text': 'recipe-text'}
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_sets(sender, instance, update_fields, **kwargs):
+    fields = set(RECIPE_SET_FIELDS)
+    if update_fields is not None:
+        fields &= set(update_fields)
+    if (response_cache() is None or instance._state.adding
+            or not fields):
+        return
+    # the saved values are needed to tell which filtered lists change
+    saved = Recipe.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._changed_recipe_sets = {
+        RECIPE_SET_FIELDS[field] for field in fields
+        if saved is None or saved[field] != getattr(
+            instance, 'author_id' if field == 'author' else field)
+    }
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(sender, instance, created, **kwargs):
+    tags = {f'recipe:{instance.pk}'}
+    if created:
+        tags.add('recipe-list')
+    tags.update(instance.__dict__.pop('_changed_recipe_sets', ()))
+    invalidate_responses_on_commit(tags)
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    invalidate_responses_on_commit([f'recipe:{instance.pk}', 'recipe-list'])
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    invalidate_responses_on_commit([f'recipe:{instance.recipe_id}'])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action == 'pre_clear' and reverse:
+        # pk_set is not sent for clear()
+        instance._cleared_recipes = list(sender.objects.filter(
+            tag=instance).values_list('recipe_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = instance.__dict__.pop('_cleared_recipes', [])
+    else:
+        recipe_ids = pk_set
+    invalidate_responses_on_commit(
+        [f'recipe:{pk}' for pk in recipe_ids] + ['recipe-tags'])
+
+
+@receiver(m2m_changed, sender=User.favorite_recipes.through)
+def invalidate_favorites_ordering(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_responses_on_commit(['recipe-favorites'])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields is not None
+                   and not AUTHOR_FIELDS.intersection(update_fields)):
+        return
+    author_id = instance.pk
+    transaction.on_commit(lambda: bump_author_version(author_id))
+    invalidate_responses_on_commit([f'author:{author_id}'])
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    # logout, and the cascade when a user is deleted
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.evict([key]))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_user_tokens(sender, instance, update_fields=None, **kwargs):
+    # password changes, deactivation and any other edit of the user, but
+    # not the last_login update of every login
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: token_cache.evict_user(user_id))
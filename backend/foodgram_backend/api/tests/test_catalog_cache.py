@@ -0,0 +1,58 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Ingredient, Tag
+from recipes.tests.utils import (FoodgramTestCase, create_ingredient,
+                                 create_tag)
+
+
+class CatalogCacheTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tag = create_tag('breakfast')
+        create_ingredient('мука')
+        create_ingredient('молоко', 'мл')
+
+    def names(self, url, **params):
+        return [item['name'] for item in self.client.get(url, params).json()]
+
+    def test_cached_without_queries(self):
+        for url in ('/api/tags/', f'/api/tags/{self.tag.pk}/',
+                    '/api/ingredients/'):
+            etag = self.client.get(url)['ETag']
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url)['ETag'], etag)
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(len(queries), 0, url)
+
+    def test_gzip(self):
+        response = self.client.get('/api/tags/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotEqual(response['ETag'],
+                            self.client.get('/api/tags/')['ETag'])
+
+    def test_tag_change_invalidates(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            create_tag('dinner')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(slug='dinner').get().delete()
+        self.assertEqual(self.names('/api/tags/'), ['breakfast'])
+
+    def test_ingredient_change_invalidates(self):
+        self.assertEqual(self.names('/api/ingredients/', name='мо'),
+                         ['молоко'])
+        with self.captureOnCommitCallbacks(execute=True):
+            create_ingredient('морковь', 'шт')
+        self.assertEqual(self.names('/api/ingredients/', name='мо'),
+                         ['молоко', 'морковь'])
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = Ingredient.objects.get(name='молоко')
+            ingredient.name = 'сливки'
+            ingredient.save()
+        self.assertEqual(self.names('/api/ingredients/', name='мо'),
+                         ['морковь'])
@@ -0,0 +1,82 @@
+import time
+from unittest import mock
+
+from recipes.tests.utils import (FoodgramTestCase, create_ingredient,
+                                 create_recipe, create_tag, create_user)
+
+
+class RecipeConditionalTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        self.tag = create_tag('breakfast')
+        self.ingredient = create_ingredient('мука')
+        self.recipe = create_recipe(
+            self.author, [(self.ingredient, 100)], [self.tag])
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def test_not_a_number_is_not_found(self):
+        self.assertEqual(self.client.get('/api/recipes/abc/').status_code,
+                         404)
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.client.get('/api/recipes/abc/').status_code,
+                         404)
+
+    def test_missing_recipe_is_not_found(self):
+        self.assertEqual(
+            self.client.get(f'/api/recipes/{self.recipe.pk + 1}/')
+            .status_code, 404)
+
+    def test_unchanged_recipe_is_not_modified(self):
+        self.client.force_authenticate(self.reader)
+        for url in (self.url, '/api/recipes/', '/api/recipes/?cursor='):
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+
+    def test_edit_changes_etag(self):
+        self.client.force_authenticate(self.reader)
+        etags = {url: self.client.get(url)['ETag']
+                 for url in (self.url, '/api/recipes/')}
+        author = self.client_class()
+        author.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = author.patch(self.url, {
+                'name': 'новое название', 'text': 'текст',
+                'cooking_time': 5, 'tags': [self.tag.pk],
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 5}],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def rename_author(self):
+        # a minute ahead, so that the change is after any Last-Modified
+        # already sent within the same second
+        with mock.patch('api.caching.time.time_ns',
+                        return_value=time.time_ns() + 60 * 10 ** 9), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.author.last_name = 'Новая'
+            self.author.save()
+
+    def test_author_rename_changes_etag(self):
+        self.client.force_authenticate(self.reader)
+        etags = {url: self.client.get(url)['ETag']
+                 for url in (self.url, '/api/recipes/')}
+        self.rename_author()
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertContains(response, 'Новая')
+
+    def test_author_rename_changes_last_modified(self):
+        modified = {url: self.client.get(url)['Last-Modified']
+                    for url in (self.url, '/api/recipes/')}
+        self.rename_author()
+        for url, since in modified.items():
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertContains(response, 'Новая')
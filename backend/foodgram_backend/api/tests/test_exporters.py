@@ -0,0 +1,115 @@
+import csv
+import io
+import re
+from unittest import skipUnless
+
+from django.conf import settings
+from django.test import override_settings
+
+from api.exporters import (AMOUNT_GAP, FONT_SIZE, pdf_available, pdf_font,
+                           pdf_lines)
+from recipes.tests.utils import (FoodgramTestCase, create_ingredient,
+                                 create_recipe, create_user)
+
+try:
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+except ImportError:
+    stringWidth = None
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+URL = '/api/recipes/download_shopping_cart/'
+LONG_NAME = 'очень длинное название ингредиента ' * 6 + 'без_пробелов' * 20
+
+
+class ExportTestCase(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.user = create_user('user')
+        flour = create_ingredient('мука')
+        salt = create_ingredient(LONG_NAME, 'щепотка')
+        self.user.shopping_cart.add(
+            create_recipe(author, [(flour, 100), (salt, 2)]),
+            create_recipe(author, [(flour, 50)]))
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get(URL, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+
+class ShoppingCartExportTests(ExportTestCase):
+    def test_text(self):
+        lines = self.export(format='txt').decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('• мука(г):'))
+        self.assertTrue(lines[0].endswith('150'))
+        self.assertTrue(lines[1].endswith('2'))
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export(format='csv')
+                                           .decode())))
+        self.assertEqual(rows, [
+            ['ингредиент', 'единица измерения', 'количество'],
+            ['мука', 'г', '150'],
+            [LONG_NAME, 'щепотка', '2'],
+        ])
+
+    def test_unmatched_accept_gets_text(self):
+        response = self.client.get(URL, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; charset=utf-8')
+
+    def test_unknown_format_is_not_found(self):
+        for export_format in ('xml', 'json'):
+            response = self.client.get(URL, {'format': export_format})
+            self.assertEqual(response.status_code, 404, export_format)
+
+    @override_settings(SHOPPING_CART_PDF_FONT='/nonexistent.ttf')
+    def test_pdf_without_font(self):
+        self.assertEqual(self.client.get(URL, {'format': 'pdf'})
+                         .status_code, 400)
+
+
+@skipUnless(pdf_available(), 'reportlab or the PDF font is missing')
+class PDFExportTests(ExportTestCase):
+    def test_long_names_wrapped_before_amount(self):
+        font = pdf_font(settings.SHOPPING_CART_PDF_FONT)
+        width = 400
+        lines = list(pdf_lines([(LONG_NAME, '1000')], font, width))
+        self.assertGreater(len(lines), 2)
+        for text, amount in lines:
+            gap = AMOUNT_GAP if amount else 0
+            self.assertLessEqual(
+                stringWidth(text + amount, font, FONT_SIZE) + gap, width)
+        self.assertEqual([amount for _, amount in lines],
+                         [''] * (len(lines) - 1) + ['1000'])
+        self.assertEqual(''.join(text for text, _ in lines).replace(' ', ''),
+                         LONG_NAME.replace(' ', ''))
+
+    def test_pdf(self):
+        content = self.export(format='pdf')
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertTrue(content.rstrip().endswith(b'%%EOF'))
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', content)), 1)
+
+    def test_pages(self):
+        for number in range(60):
+            self.user.shopping_cart.add(create_recipe(
+                self.user, [(create_ingredient(f'ингредиент {number}'), 1)]))
+        content = self.export(format='pdf')
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', content)), 2)
+
+    @skipUnless(pypdf, 'pypdf is not installed')
+    def test_pdf_text(self):
+        reader = pypdf.PdfReader(io.BytesIO(self.export(format='pdf')))
+        text = reader.pages[0].extract_text()
+        self.assertIn('Список покупок', text)
+        self.assertIn('• мука (г)', text)
+        self.assertIn('150', text)
@@ -0,0 +1,135 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.caching import RESPONSE_LOCK_KEY
+from recipes.models import IngredientInRecipe
+from recipes.tests.utils import (FoodgramTestCase, create_ingredient,
+                                 create_recipe, create_tag, create_user)
+
+
+class AnonymousResponseCacheTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        self.tag = create_tag('breakfast')
+        self.ingredient = create_ingredient('мука')
+        self.recipe = create_recipe(
+            self.author, [(self.ingredient, 100)], [self.tag], name='блины')
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def names(self, **params):
+        return [recipe['name'] for recipe in
+                self.get('/api/recipes/', **params)['results']]
+
+    def assertCached(self, url, **params):
+        content = self.get(url, **params)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(url, **params), content)
+        self.assertEqual(len(queries), 0, url)
+
+    def test_cached_without_queries(self):
+        self.assertCached(self.url)
+        self.assertCached('/api/recipes/')
+        self.assertCached('/api/recipes/', tags='breakfast')
+
+    def test_authenticated_not_cached(self):
+        self.client.force_authenticate(self.reader)
+        self.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.get(self.url)
+        self.assertGreater(len(queries), 0)
+
+    @override_settings(RESPONSE_CACHE='')
+    def test_disabled(self):
+        self.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.get(self.url)
+        self.assertGreater(len(queries), 0)
+
+    def test_recipe_edit_invalidates(self):
+        self.assertEqual(self.names(), ['блины'])
+        self.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'оладьи'
+            self.recipe.save()
+        self.assertEqual(self.get(self.url)['name'], 'оладьи')
+        self.assertEqual(self.names(), ['оладьи'])
+
+    def test_ingredient_edit_invalidates(self):
+        self.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = IngredientInRecipe.objects.get(recipe=self.recipe)
+            ingredient.amount = 5
+            ingredient.save()
+        self.assertEqual(self.get(self.url)['ingredients'][0]['amount'], 5)
+
+    def test_new_recipe_invalidates_lists(self):
+        self.assertEqual(self.names(), ['блины'])
+        self.assertEqual(self.names(tags='breakfast'), ['блины'])
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, name='каша')
+        self.assertEqual(self.names(), ['каша', 'блины'])
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, tags=[self.tag], name='сырники')
+        self.assertEqual(self.names(tags='breakfast'), ['сырники', 'блины'])
+
+    def test_tag_change_invalidates_filtered_list(self):
+        other = create_recipe(self.author, name='каша')
+        self.assertEqual(self.names(tags='breakfast'), ['блины'])
+        with self.captureOnCommitCallbacks(execute=True):
+            other.tags.add(self.tag)
+        self.assertEqual(self.names(tags='breakfast'), ['каша', 'блины'])
+
+    def test_favorites_invalidate_ordering(self):
+        create_recipe(self.author, name='каша')
+        self.assertEqual(self.names(ordering='-favorites'), ['каша', 'блины'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.favorite_recipes.add(self.recipe)
+        self.assertEqual(self.names(ordering='-favorites'), ['блины', 'каша'])
+
+    def test_author_rename_invalidates(self):
+        self.get(self.url)
+        self.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Новое'
+            self.author.save()
+        self.assertEqual(self.get(self.url)['author']['first_name'], 'Новое')
+        self.assertEqual(
+            self.get('/api/recipes/')['results'][0]['author']['first_name'],
+            'Новое')
+
+    def test_recipe_delete_invalidates(self):
+        self.get(self.url)
+        self.assertEqual(self.names(), ['блины'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.names(), [])
+
+    @override_settings(RESPONSE_CACHE_LOCK_TIMEOUT=0)
+    def test_held_lock_falls_back_to_rendering(self):
+        add = cache.add
+
+        def held_elsewhere(key, *args, **kwargs):
+            # another process renders the entry and has not stored it yet
+            if key.startswith(RESPONSE_LOCK_KEY.format('')):
+                cache.set(key, True)
+                return False
+            return add(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'add', held_elsewhere):
+            self.assertEqual(self.get(self.url)['name'], 'блины')
+        # nothing was stored by the request that did not hold the lock
+        with CaptureQueriesContext(connection) as queries:
+            self.get(self.url)
+        self.assertGreater(len(queries), 0)
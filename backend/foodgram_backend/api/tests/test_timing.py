@@ -0,0 +1,30 @@
+import re
+
+from django.test import modify_settings
+
+from recipes.tests.utils import FoodgramTestCase, create_recipe, create_user
+
+
+@modify_settings(
+    MIDDLEWARE={'prepend': 'api.middleware.RequestTimingMiddleware'})
+class RequestTimingTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('author')
+        create_recipe(self.user)
+        self.client.force_authenticate(self.user)
+
+    def timings(self, url):
+        header = self.client.get(url)['Server-Timing']
+        return {name: float(duration) for name, duration in
+                re.findall(r'(\w+);(?:desc="[^"]*";)?dur=([\d.]+)', header)}
+
+    def test_serialization_timed_separately(self):
+        for url in ('/api/recipes/', '/api/users/', '/api/users/me/'):
+            timings = self.timings(url)
+            self.assertEqual(
+                set(timings), {'db', 'serialize', 'view', 'render', 'total'})
+            self.assertGreater(timings['serialize'], 0, url)
+            self.assertLessEqual(
+                timings['db'] + timings['serialize'] + timings['render'],
+                timings['total'] + 0.01, url)
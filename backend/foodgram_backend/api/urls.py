@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from .views import IngredientViewset, RecipeViewSet, TagViewSet, UserViewSet
+from .views import (IngredientViewset, RecipeViewSet, TagViewSet,
+                    TokenCacheStatsView, UserViewSet)
 
 router = routers.DefaultRouter()
 router.register('users', UserViewSet, basename='users')
@@ -11,6 +12,7 @@ router.register('tags', TagViewSet, basename='tags')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('auth/token-cache/', TokenCacheStatsView.as_view()),
     path('auth/', include('djoser.urls.authtoken')),
 
 ]
@@ -1,17 +1,35 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.exceptions import ValidationError
+from django.db.models import (BooleanField, Count, Exists, OuterRef,
+                              Prefetch, Value)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
+from recipes.catalog import get_ingredient_catalog
+from recipes.feed import feed_recipe_ids
 from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from recipes.search import search_recipes
+from .authentication import token_cache
+from .caching import (AnonymousCacheMixin, CatalogCacheMixin,
+                      conditional_response, get_author_versions,
+                      version_time)
+from .exporters import EXPORTERS, pdf_available, shopping_cart_items
 from .filters import IngredientsSearchFilter
-from .pagination import CustomPagination
+from .pagination import CustomPagination, TimelinePagination
 from .permissions import (StaffOrAuthorOrReadOnly, PasswordPermission)
+from .renderers import (ShoppingCartCSVRenderer, ShoppingCartPDFRenderer,
+                        ShoppingCartTextRenderer)
+from .representations import recipe_rows, represent_recipes
 from .serializers import (IngredientSerializer, RecipeCreateSerializer,
                           RecipesMinifiedSerializer, RecipeSerializer,
                           TagSerializer, UserCreateSerializer, UserSerializer,
@@ -90,32 +108,40 @@ class UserViewSet(ModelViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
     def get_serializer(self, *args, **kwargs):
-        if self.action == 'subscriptions':
-            serializer = UserWithRecipesSerializer(
-                self.get_queryset(),
-                context={'request': self.request},
-                many=True)
-            return serializer
-        if self.action == 'subscribe':
-            serializer = UserWithRecipesSerializer(
-                self.get_object(),
-                context={'request': self.request},
-                many=False
-            )
-            return serializer
         if self.action == 'create':
             serializer = UserCreateSerializer(*args, **kwargs)
             return serializer
-        kwargs.setdefault('context', {'request': self.request})
+        kwargs.setdefault('context', self.get_serializer_context())
+        if self.action in ('subscriptions', 'subscribe'):
+            return UserWithRecipesSerializer(*args, **kwargs)
         return UserSerializer(*args, **kwargs)
 
+    def get_recipes_prefetch(self):
+        queryset = Recipe.objects.only(
+            'id', 'name', 'image', 'image_variants', 'image_status',
+            'cooking_time', 'author'
+        ).order_by('-id')
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit:
+            queryset = queryset[:int(recipes_limit)]
+        return Prefetch('recipes', queryset=queryset,
+                        to_attr='recipes_preview')
+
     def get_queryset(self):
         if self.action == 'subscriptions':
-            return self.request.user.subscriptions.all()
-        return User.objects.all()
+            queryset = self.request.user.subscriptions.annotate(
+                is_subscribed=Value(True, output_field=BooleanField()))
+        else:
+            queryset = User.objects.all()
+        if self.action in ('subscriptions', 'subscribe'):
+            queryset = queryset.annotate(
+                recipes_count=Count('recipes')
+            ).prefetch_related(self.get_recipes_prefetch())
+        return queryset.order_by('id')
 
 
-class IngredientViewset(viewsets.ModelViewSet):
+class IngredientViewset(CatalogCacheMixin, viewsets.ModelViewSet):
+    catalog = 'ingredients'
     queryset = Ingredient.objects.all()
     permission_classes = [permissions.AllowAny, ]
     http_method_names = ['get', ]
@@ -124,9 +150,29 @@ class IngredientViewset(viewsets.ModelViewSet):
     search_fields = ['^name', ]
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, self.search_catalog, request)
+
+    def search_catalog(self, request):
+        catalog = get_ingredient_catalog()
+        if catalog is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            serializer = self.get_serializer(
+                queryset[:settings.INGREDIENT_SEARCH_LIMIT], many=True)
+            return Response(serializer.data)
+        return Response(catalog.search(
+            request.query_params.get('name', ''),
+            limit=settings.INGREDIENT_SEARCH_LIMIT))
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
+    queryset = Recipe.objects.defer('search_vector')
+    orderings = {
+        'favorites': ('favorites_count', 'id'),
+        '-favorites': ('-favorites_count', '-id'),
+    }
+    default_ordering = ('-id',)
+    search_ordering = ('-search_rank', '-id')
     pagination_class = CustomPagination
     permission_classes = [StaffOrAuthorOrReadOnly, ]
     serializer_class = RecipeCreateSerializer
@@ -136,27 +182,160 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related(
+            'author'
+        ).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch(
+                'ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient').order_by('pk')
+            )
+        )
+        queryset = self.annotate_related(queryset)
         if self.request.query_params.get('is_favorited'):
-            queryset = queryset.filter(favored_by=self.request.user)
+            queryset = queryset.filter(is_favorited=True)
         if self.request.query_params.get('is_in_shopping_cart'):
-            queryset = queryset.filter(shopping_carts=self.request.user)
+            queryset = queryset.filter(is_in_shopping_cart=True)
 
         tags = self.request.query_params.getlist('tags')
         if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
+            queryset = queryset.filter(Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('pk'), tag__slug__in=tags)))
+        search = self.request.query_params.get('search', '').strip()
+        if search:
+            queryset = search_recipes(queryset, search)
+        return queryset.order_by(*self.get_feed_ordering())
+
+    def annotate_related(self, queryset):
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(User.favorite_recipes.through.objects
+                                    .filter(user=user,
+                                            recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(User.shopping_cart.through.objects
+                                           .filter(user=user,
+                                                   recipe=OuterRef('pk')))
+            )
+        else:
+            queryset = queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
         return queryset
 
+    def get_feed_ordering(self):
+        ordering = self.request.query_params.get('ordering')
+        if ordering in self.orderings:
+            return self.orderings[ordering]
+        if self.request.query_params.get('search', '').strip():
+            return self.search_ordering
+        return self.default_ordering
+
+    def get_prefetch_tags(self, request):
+        if self.action != 'list':
+            return []
+        tags = ['recipe-list']
+        if request.query_params.getlist('tags'):
+            tags.append('recipe-tags')
+        if request.query_params.get('search', '').strip():
+            tags.append('recipe-text')
+        if request.query_params.get('ordering') in self.orderings:
+            tags.append('recipe-favorites')
+        return tags
+
+    def get_response_tags(self, data):
+        recipes = data['results'] if self.action == 'list' else [data]
+        return ([f'recipe:{recipe["id"]}' for recipe in recipes]
+                + [f'author:{recipe["author"]["id"]}' for recipe in recipes])
+
+    def list(self, request, *args, **kwargs):
+        return self.anonymous_cached(
+            request, self.conditional_list, request, *args, **kwargs)
+
+    def conditional_list(self, request, *args, **kwargs):
+        # the validator is taken from the page itself, so that a
+        # revalidation costs no more than the page query
+        page = self.paginate_queryset(
+            recipe_rows(self.filter_queryset(self.get_queryset())))
+        state, last_modified = self.recipes_state(page)
+        validator = (request.get_full_path(), self.paginator.page_state(),
+                     state)
+        return conditional_response(
+            request, validator, last_modified,
+            self.represent_list, page, request)
+
+    def represent_list(self, page, request):
+        return self.get_paginated_response(
+            represent_recipes(page, request, thumbnails=True))
+
+    def recipes_state(self, rows):
+        # what recipe responses depend on apart from the viewer: the
+        # recipes and the authors shown with them
+        authors = get_author_versions({row['author_id'] for row in rows})
+        last_modified = max(
+            [row['updated_at'] for row in rows]
+            + [version_time(version) for version in authors.values()],
+            default=None)
+        state = ([(row['id'], row['updated_at']) for row in rows],
+                 sorted(authors.items()))
+        return state, last_modified
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.anonymous_cached(
+            request, self.conditional_retrieve, request, *args, **kwargs)
+
+    def conditional_retrieve(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            rows = list(Recipe.objects.filter(pk=kwargs['pk']).values(
+                'id', 'updated_at', 'author_id'))
+        except (ValueError, ValidationError):
+            # not an id at all, retrieve() answers it with 404
+            rows = None
+        if not rows:
+            return super().retrieve(request, *args, **kwargs)
+        state, last_modified = self.recipes_state(rows)
+        return conditional_response(
+            request, state, last_modified,
+            self.represent_detail, request, *args, **kwargs)
+
+    def represent_detail(self, request, *args, **kwargs):
+        recipe = get_object_or_404(
+            recipe_rows(self.filter_queryset(self.get_queryset())),
+            pk=kwargs['pk'])
+        self.check_object_permissions(request, recipe)
+        return Response(represent_recipes([recipe], request)[0])
+
     def get_permissions(self):
-        if self.action in ('favorite', 'shopping_cart'):
+        if self.action in ('favorite', 'shopping_cart',
+                           'download_shopping_cart', 'feed'):
             return (permissions.IsAuthenticated(),)
         return super().get_permissions()
 
+    def perform_content_negotiation(self, request, force=False):
+        # an Accept header that matches none of the export formats, such
+        # as application/json of API clients, gets the text one, while an
+        # unknown ?format= is still answered with 404
+        if self.action == 'download_shopping_cart' and not (
+                self.format_kwarg or request.query_params.get(
+                    api_settings.URL_FORMAT_OVERRIDE)):
+            force = True
+        return super().perform_content_negotiation(request, force)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['thumbnails'] = self.action in ('list', 'feed')
+        return context
+
     def get_serializer(self, *args, **kwargs):
         kwargs.setdefault('context', self.get_serializer_context())
         if self.action in ('favorite', 'shopping_cart'):
             return RecipesMinifiedSerializer(*args, **kwargs)
-        if self.action in ('retrieve', 'list'):
+        if self.action in ('retrieve', 'list', 'feed'):
             return RecipeSerializer(*args, **kwargs)
         return super().get_serializer(*args, **kwargs)
 
@@ -203,29 +382,44 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return response
 
     @action(detail=False, methods=['GET'])
+    def feed(self, request, *args, **kwargs):
+        paginator = TimelinePagination()
+        recipe_ids = paginator.paginate_ids(
+            request, partial(feed_recipe_ids, request.user))
+        # the list filters, search and ordering do not apply to the feed
+        recipes = recipe_rows(self.annotate_related(
+            Recipe.objects.filter(pk__in=recipe_ids)).order_by('-id'))
+        return paginator.get_paginated_response(
+            represent_recipes(recipes, request, thumbnails=True))
+
+    @action(detail=False, methods=['GET'],
+            renderer_classes=[ShoppingCartTextRenderer,
+                              ShoppingCartCSVRenderer,
+                              ShoppingCartPDFRenderer])
     def download_shopping_cart(self, request, *args, **kwargs):
-        user = request.user
-        total = IngredientInRecipe.objects\
-            .filter(recipe__in=user.shopping_cart.all())\
-            .values('ingredient', 'ingredient__name',
-                    'ingredient__measurement_unit')\
-            .annotate(total=Sum('amount'))
-        content = ''
-        for item in total.all():
-            content += f'• {item["ingredient__name"]}'
-            content += f'({item["ingredient__measurement_unit"]}):'
-            content += ('.' * (80 - len(
-                item["ingredient__name"] + item["ingredient__measurement_unit"]
-                + str(item['total']))))
-            content += f'{item["total"]}\n'
-
-        response = HttpResponse(content, content_type='text/plain')
+        export_format = request.accepted_renderer.format
+        if export_format == 'pdf' and not pdf_available():
+            content = {'error': 'экспорт в PDF недоступен'}
+            return Response(content, status=status.HTTP_400_BAD_REQUEST)
+        exporter, content_type, filename = EXPORTERS[export_format]
+        response = StreamingHttpResponse(
+            exporter(shopping_cart_items(request.user)),
+            content_type=content_type)
         response['Content-Disposition'] = 'attachment; filename={0}'.\
-            format('shopping_cart.txt')
+            format(filename)
         return response
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
+    catalog = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+
+
+class TokenCacheStatsView(APIView):
+    # numbers of the process that answers the request
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(token_cache.stats())
@@ -40,6 +40,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if os.getenv('FOODGRAM_REQUEST_TIMING') == 'True':
+    MIDDLEWARE.insert(0, 'api.middleware.RequestTimingMiddleware')
+
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv('FOODGRAM_SLOW_REQUEST_MS', 500))
+
 ROOT_URLCONF = 'foodgram_backend.urls'
 
 TEMPLATES = [
@@ -80,6 +85,50 @@ else:
         }
     }
 
+# catalog versions, token evictions and cached responses have to be seen
+# by every worker, so the default cache lives on disk rather than in the
+# memory of one process; point it at memcached or redis in production.
+# FileBasedCache lists the whole directory to cull it on every set() and
+# add(), which includes user state bumps and response cache writes, so
+# each write gets slower as the directory approaches MAX_ENTRIES. Its add()
+# is a check followed by a write rather than an atomic operation: two
+# processes can both win the response cache lock and render the same entry,
+# or both create a missing version and keep the later one.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'FOODGRAM_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('FOODGRAM_CACHE_LOCATION', BASE_DIR / 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('FOODGRAM_CACHE_MAX_ENTRIES',
+                                         10000)),
+        },
+    }
+}
+# rendered tag and ingredient responses, versions are kept until changed
+CATALOG_CACHE_TIMEOUT = int(os.getenv('FOODGRAM_CATALOG_CACHE_TIMEOUT',
+                                      86400))
+# alias in CACHES that keeps rendered anonymous recipe responses, an empty
+# value turns the response cache off
+RESPONSE_CACHE = os.getenv('FOODGRAM_RESPONSE_CACHE', 'default')
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('FOODGRAM_RESPONSE_CACHE_TIMEOUT',
+                                       3600))
+# how long other requests wait for the one recomputing an entry
+RESPONSE_CACHE_LOCK_TIMEOUT = int(os.getenv(
+    'FOODGRAM_RESPONSE_CACHE_LOCK_TIMEOUT', 10))
+
+# token -> user lookups are kept per process for TOKEN_CACHE_TTL seconds,
+# TOKEN_CACHE names an optional shared layer in CACHES. Without it a
+# revoked token keeps working in other processes until their entries
+# expire, hence the short default TTL
+TOKEN_CACHE = os.getenv('FOODGRAM_TOKEN_CACHE', '')
+TOKEN_CACHE_SIZE = int(os.getenv('FOODGRAM_TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('FOODGRAM_TOKEN_CACHE_TTL',
+                                60 if TOKEN_CACHE else 5))
+TOKEN_CACHE_SHARED_TTL = int(os.getenv('FOODGRAM_TOKEN_CACHE_SHARED_TTL',
+                                       600))
+
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -121,6 +170,33 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+INGREDIENT_CATALOG_PATH = os.getenv(
+    'FOODGRAM_INGREDIENT_CATALOG', BASE_DIR / 'ingredient_catalog.bin')
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('FOODGRAM_INGREDIENT_SEARCH_LIMIT',
+                                        50))
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'FOODGRAM_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+RECIPE_IMAGE_MAX_BYTES = int(os.getenv('FOODGRAM_IMAGE_MAX_BYTES',
+                                       10 * 1024 * 1024))
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('FOODGRAM_IMAGE_MAX_PIXELS',
+                                        40_000_000))
+RECIPE_IMAGE_WIDTHS = [
+    int(width) for width in
+    os.getenv('FOODGRAM_IMAGE_WIDTHS', '320,640,1280').split(',')
+]
+# threads per process that build image variants and fan recipes out to
+# feeds in the background, 0 leaves the queues to management commands
+BACKGROUND_WORKERS = int(os.getenv('FOODGRAM_BACKGROUND_WORKERS', 2))
+BACKGROUND_TASK_LEASE = int(os.getenv('FOODGRAM_BACKGROUND_TASK_LEASE', 300))
+BACKGROUND_TASK_MAX_ATTEMPTS = int(os.getenv(
+    'FOODGRAM_BACKGROUND_TASK_ATTEMPTS', 3))
+
+FEED_LENGTH = int(os.getenv('FOODGRAM_FEED_LENGTH', 500))
+# authors with more followers are pulled into feeds on read
+FEED_FANOUT_LIMIT = int(os.getenv('FOODGRAM_FEED_FANOUT_LIMIT', 5000))
+
 if os.getenv('FOODGRAM_CSRF_TRUSTED_ORIGINS'):
     CSRF_TRUSTED_ORIGINS = os.getenv('FOODGRAM_CSRF_TRUSTED_ORIGINS')\
         .split(',')
@@ -132,7 +208,16 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
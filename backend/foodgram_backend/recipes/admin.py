@@ -1,17 +1,45 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 
-from .models import Ingredient, IngredientInRecipe, Recipe, Tag
+from .carts import cart_users, rebuild_shopping_carts
+from .models import ImageTask, Ingredient, IngredientInRecipe, Recipe, Tag
+from .workers import enqueue
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    fields = ['name', 'author', 'image', 'tags', 'text',
-              'cooking_time', 'favored_counter']
+    fields = ['name', 'author', 'image', 'image_status', 'tags', 'text',
+              'cooking_time', 'favorites_count', 'shopping_carts_count']
     search_fields = ['name']
-    readonly_fields = ('favored_counter',)
-    list_display = ['name', 'author']
+    readonly_fields = ('image_status', 'favorites_count',
+                       'shopping_carts_count')
+    list_display = ['name', 'author', 'favorites_count']
     list_filter = ['name', 'author', 'tags']
 
+    def save_model(self, request, obj, form, change):
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            obj.image_status = Recipe.IMAGE_PENDING
+        super().save_model(request, obj, form, change)
+        if image_changed:
+            enqueue(ImageTask, obj)
+
+
+class IngredientInRecipeAdmin(admin.ModelAdmin):
+    # edits here bypass the API, recount the carts holding the recipe
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rebuild_shopping_carts(cart_users(obj.recipe_id))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_shopping_carts(cart_users(obj.recipe_id))
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for recipe_id in recipe_ids:
+            rebuild_shopping_carts(cart_users(recipe_id))
+
 
 class IngredientAdmin(admin.ModelAdmin):
     list_filter = ['name']
@@ -28,5 +56,5 @@ class TagAdmin(admin.ModelAdmin):
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Tag)
-admin.site.register(IngredientInRecipe)
+admin.site.register(IngredientInRecipe, IngredientInRecipeAdmin)
 admin.site.unregister(Group)
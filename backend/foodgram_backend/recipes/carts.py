@@ -0,0 +1,80 @@
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import IngredientInRecipe, ShoppingCartItem
+
+User = get_user_model()
+BATCH_SIZE = 5000
+
+
+def recipe_amounts(recipe_ids):
+    return dict(
+        IngredientInRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .values('ingredient').annotate(total=Sum('amount'))
+        .values_list('ingredient', 'total'))
+
+
+def cart_users(recipe_id):
+    return list(User.shopping_cart.through.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True))
+
+
+def change_cart_totals(user_ids, deltas):
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    # rows are created empty first so that a single UPDATE can apply every
+    # delta, whether the row existed before or not
+    ShoppingCartItem.objects.bulk_create(
+        [ShoppingCartItem(user_id=user_id, ingredient_id=ingredient_id,
+                          total=0)
+         for user_id in user_ids
+         for ingredient_id, delta in deltas.items() if delta > 0],
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    items = ShoppingCartItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas)
+    items.update(total=Greatest(F('total') + Case(
+        *(When(ingredient_id=pk, then=Value(delta))
+          for pk, delta in deltas.items()),
+        default=Value(0)), Value(0)))
+    items.filter(total=0).delete()
+
+
+def add_to_carts(user_ids, recipe_ids):
+    change_cart_totals(user_ids, recipe_amounts(recipe_ids))
+
+
+def remove_from_carts(user_ids, recipe_ids):
+    change_cart_totals(user_ids, {
+        pk: -total for pk, total in recipe_amounts(recipe_ids).items()})
+
+
+def recipe_ingredients_changed(recipe_id, old, new):
+    # old and new map ingredient ids to amounts
+    deltas = {pk: new.get(pk, 0) - old.get(pk, 0) for pk in old.keys() | new}
+    if any(deltas.values()):
+        change_cart_totals(cart_users(recipe_id), deltas)
+
+
+def rebuild_shopping_carts(user_ids=None):
+    items = ShoppingCartItem.objects.all()
+    # a single filter() call, a second one would join the cart table again
+    # and multiply the sums
+    lookup = {'recipe__shopping_carts__isnull': False}
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        lookup = {'recipe__shopping_carts__in': user_ids}
+    totals = IngredientInRecipe.objects.filter(**lookup).values_list(
+        'recipe__shopping_carts', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by().iterator()
+    with transaction.atomic():
+        items.delete()
+        while batch := list(islice(totals, BATCH_SIZE)):
+            ShoppingCartItem.objects.bulk_create(
+                ShoppingCartItem(user_id=user_id, ingredient_id=ingredient_id,
+                                 total=total)
+                for user_id, ingredient_id, total in batch)
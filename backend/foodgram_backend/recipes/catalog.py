@@ -0,0 +1,134 @@
+import bisect
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .models import Ingredient
+
+# file layout: header, offsets table, records sorted by casefolded name
+MAGIC = b'FGICAT01'
+HEADER = struct.Struct('<8sI')
+OFFSET = struct.Struct('<I')
+RECORD = struct.Struct('<QHHH')
+
+_state = threading.local()
+_catalog = None
+
+
+def build_catalog(path=None):
+    path = path or settings.INGREDIENT_CATALOG_PATH
+    entries = sorted(
+        (name.casefold().encode(), pk, name.encode(), unit.encode())
+        for pk, name, unit in Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit').iterator()
+    )
+    offsets = bytearray()
+    records = bytearray()
+    for key, pk, name, unit in entries:
+        offsets += OFFSET.pack(len(records))
+        records += RECORD.pack(pk, len(key), len(name), len(unit))
+        records += key + name + unit
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as catalog_file:
+        catalog_file.write(HEADER.pack(MAGIC, len(entries)))
+        catalog_file.write(offsets)
+        catalog_file.write(records)
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+@contextmanager
+def deferred_rebuild():
+    _state.deferred = True
+    try:
+        yield
+    finally:
+        _state.deferred = False
+        build_catalog()
+
+
+def rebuild_deferred():
+    return getattr(_state, 'deferred', False)
+
+
+class IngredientCatalog:
+    def __init__(self, path):
+        with open(path, 'rb') as catalog_file:
+            self.stat = os.fstat(catalog_file.fileno())
+            self.buffer = mmap.mmap(catalog_file.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an ingredient catalog')
+        self.records_start = HEADER.size + OFFSET.size * self.count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.key(index)
+
+    def is_stale(self, stat):
+        return (stat.st_ino, stat.st_mtime_ns) != (
+            self.stat.st_ino, self.stat.st_mtime_ns)
+
+    def record_start(self, index):
+        offset, = OFFSET.unpack_from(
+            self.buffer, HEADER.size + OFFSET.size * index)
+        return self.records_start + offset
+
+    def key(self, index):
+        start = self.record_start(index)
+        key_len = RECORD.unpack_from(self.buffer, start)[1]
+        start += RECORD.size
+        return self.buffer[start:start + key_len]
+
+    def item(self, index):
+        start = self.record_start(index)
+        pk, key_len, name_len, unit_len = RECORD.unpack_from(
+            self.buffer, start)
+        start += RECORD.size + key_len
+        name = self.buffer[start:start + name_len]
+        start += name_len
+        unit = self.buffer[start:start + unit_len]
+        return {
+            'id': pk,
+            'name': name.decode(),
+            'measurement_unit': unit.decode(),
+        }
+
+    def search(self, prefix, limit=None):
+        prefix = prefix.casefold().encode()
+        index = bisect.bisect_left(self, prefix)
+        stop = self.count
+        if limit is not None:
+            stop = min(stop, index + limit)
+        results = []
+        while index < stop and self.key(index).startswith(prefix):
+            results.append(self.item(index))
+            index += 1
+        return results
+
+
+def get_ingredient_catalog():
+    global _catalog
+    path = settings.INGREDIENT_CATALOG_PATH
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        try:
+            build_catalog(path)
+            stat = os.stat(path)
+        except (DatabaseError, OSError):
+            return None
+    if _catalog is None or _catalog.is_stale(stat):
+        try:
+            _catalog = IngredientCatalog(path)
+        except (OSError, ValueError):
+            return None
+    return _catalog
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Recipe
+
+User = get_user_model()
+
+
+def counted_relations():
+    # counter field on Recipe -> M2M through model it counts
+    return {
+        'favorites_count': User.favorite_recipes.through,
+        'shopping_carts_count': User.shopping_cart.through,
+    }
+
+
+def change_counter(field, recipe_ids, delta):
+    if not recipe_ids or not delta:
+        return
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{field: Greatest(F(field) + delta, Value(0))})
+
+
+def actual_count(through):
+    return Coalesce(Subquery(
+        through.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe').annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+def reconcile_counters():
+    drift = {}
+    for field, through in counted_relations().items():
+        drifted = Recipe.objects.annotate(
+            actual=actual_count(through)
+        ).exclude(**{field: F('actual')})
+        drift[field] = Recipe.objects.filter(
+            pk__in=drifted.values('pk')
+        ).update(**{field: actual_count(through)})
+    return drift
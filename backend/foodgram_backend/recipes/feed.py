@@ -0,0 +1,107 @@
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Recipe, TimelineEntry
+
+User = get_user_model()
+Subscription = User.subscriptions.through
+BATCH_SIZE = 1000
+
+# Feeds are fan-out-on-write: a new recipe is copied into the timeline of
+# every follower by a background task (recipes.workers), timelines are
+# trimmed to FEED_LENGTH entries. Recipes of authors with more than
+# FEED_FANOUT_LIMIT followers are never copied, and neither are recipes
+# whose fan-out has not run yet: feeds pull those from the recipe table.
+
+
+def followers(author_id):
+    return Subscription.objects.filter(to_user_id=author_id)
+
+
+def trim_timelines(user_ids):
+    overflow = TimelineEntry.objects.filter(user_id__in=user_ids).annotate(
+        position=Window(RowNumber(), partition_by=F('user_id'),
+                        order_by=F('recipe_id').desc())
+    ).filter(position__gt=settings.FEED_LENGTH).values('pk')
+    TimelineEntry.objects.filter(pk__in=overflow).delete()
+
+
+def fan_out(recipe):
+    if followers(recipe.author_id).count() > settings.FEED_FANOUT_LIMIT:
+        return
+    # read before the transaction so that it starts with a write
+    follower_ids = iter(followers(recipe.author_id).values_list(
+        'from_user_id', flat=True))
+    with transaction.atomic():
+        while batch := list(islice(follower_ids, BATCH_SIZE)):
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user_id=user_id, recipe_id=recipe.pk)
+                 for user_id in batch],
+                ignore_conflicts=True)
+            trim_timelines(batch)
+        Recipe.objects.filter(pk=recipe.pk).update(feed_pushed=True)
+
+
+def follow(user_ids, author_ids):
+    # new subscriptions get the latest recipes of the author right away,
+    # whether those were pushed already or not
+    entries = []
+    for author_id in author_ids:
+        recipe_ids = list(Recipe.objects.filter(author_id=author_id).order_by(
+            '-id').values_list('pk', flat=True)[:settings.FEED_LENGTH])
+        entries.extend(TimelineEntry(user_id=user_id, recipe_id=recipe_id)
+                       for user_id in user_ids for recipe_id in recipe_ids)
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE,
+                                      ignore_conflicts=True)
+    trim_timelines(user_ids)
+
+
+def unfollow(user_ids, author_ids):
+    TimelineEntry.objects.filter(
+        user_id__in=user_ids, recipe__author_id__in=author_ids).delete()
+
+
+def feed_recipe_ids(user, before, limit):
+    # two index range scans, the timeline and the pulled recipes, merged
+    timeline = TimelineEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(
+        feed_pushed=False,
+        author__in=Subscription.objects.filter(
+            from_user=user).values('to_user'))
+    if before is not None:
+        timeline = timeline.filter(recipe_id__lt=before)
+        pulled = pulled.filter(pk__lt=before)
+    recipe_ids = set(timeline.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True)[:limit])
+    recipe_ids.update(pulled.order_by('-id').values_list(
+        'pk', flat=True)[:limit])
+    return sorted(recipe_ids, reverse=True)[:limit]
+
+
+def pulled_authors():
+    # authors whose recipes are never fanned out
+    return list(Subscription.objects.values('to_user').annotate(
+        followers=Count('from_user')
+    ).filter(followers__gt=settings.FEED_FANOUT_LIMIT).values_list(
+        'to_user', flat=True))
+
+
+def rebuild_timelines(user_ids, up_to, excluded_authors):
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+        for user_id in user_ids:
+            recipe_ids = Recipe.objects.filter(
+                pk__lte=up_to,
+                author__in=Subscription.objects.filter(
+                    from_user_id=user_id
+                ).exclude(to_user__in=excluded_authors).values('to_user')
+            ).order_by('-id').values_list(
+                'pk', flat=True)[:settings.FEED_LENGTH]
+            TimelineEntry.objects.bulk_create(
+                TimelineEntry(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in recipe_ids)
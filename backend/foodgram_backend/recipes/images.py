@@ -0,0 +1,64 @@
+from io import BytesIO
+from os.path import basename, splitext
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANTS_DIR = 'recipes/images/variants/'
+# jpeg is what every client can show, webp is offered through srcset
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True,
+                             'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+THUMBNAIL_FORMAT = 'jpeg'
+
+
+def render_variants(image_file):
+    stem = splitext(basename(image_file.name))[0]
+    variants = {fmt: {} for fmt in VARIANT_FORMATS}
+    image_file.open('rb')
+    try:
+        with Image.open(image_file) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            for width in sorted(settings.RECIPE_IMAGE_WIDTHS):
+                # never upscale, the widest variant is the original size
+                width = min(width, image.width)
+                resized = image.copy()
+                resized.thumbnail((width, image.height), Image.LANCZOS)
+                for fmt, (pil_format, ext, options) in \
+                        VARIANT_FORMATS.items():
+                    buffer = BytesIO()
+                    resized.save(buffer, pil_format, **options)
+                    variants[fmt][str(width)] = default_storage.save(
+                        f'{VARIANTS_DIR}{stem}_{width}.{ext}',
+                        ContentFile(buffer.getvalue()))
+                if width == image.width:
+                    break
+    finally:
+        image_file.close()
+    return variants
+
+
+def delete_variants(variants):
+    for paths in variants.values():
+        for path in paths.values():
+            default_storage.delete(path)
+
+
+def srcset(variants, build_url):
+    return {
+        fmt: ', '.join(
+            f'{build_url(paths[width])} {width}w'
+            for width in sorted(paths, key=int))
+        for fmt, paths in variants.items()
+    }
+
+
+def thumbnail_path(variants):
+    paths = variants.get(THUMBNAIL_FORMAT)
+    if not paths:
+        return None
+    return paths[min(paths, key=int)]
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.catalog import build_catalog
+
+
+class Command(BaseCommand):
+    help = 'Собирает индекс ингредиентов для автодополнения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None)
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.INGREDIENT_CATALOG_PATH
+        count = build_catalog(path)
+        self.stdout.write(f'{count} ingredients written to {path}')
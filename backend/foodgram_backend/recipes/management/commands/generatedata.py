@@ -0,0 +1,211 @@
+import random
+import time
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.caching import invalidate_responses
+from recipes.carts import rebuild_shopping_carts
+from recipes.counters import reconcile_counters
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+
+User = get_user_model()
+
+IMAGES = [
+    'recipes/images/глинтвейн.jpeg',
+    'recipes/images/картофель.jpg',
+    'recipes/images/пельмени жареные.jpg',
+    'recipes/images/пельмени.jpg',
+    'recipes/images/смородина.jpg',
+    'recipes/images/хлопья.jpg',
+    'recipes/images/чай.jpg',
+    'recipes/images/шашлык.jpg',
+    'recipes/images/яичница.jpg',
+    'recipes/images/яйцо вареное.jpg',
+    'recipes/images/яйцо пашот.jpg',
+]
+DEFAULT_TAGS = [
+    ('завтрак', '#9911AA', 'breakfast'),
+    ('обед', '#ffaa11', 'dinner'),
+    ('напиток', '#11ffaa', 'drink'),
+    ('десерт', '#bb3355', 'desert'),
+]
+WORDS = ('быстрый домашний острый сладкий летний зимний праздничный '
+         'постный сытный легкий бабушкин фирменный').split()
+DISHES = ('суп салат пирог омлет рагу плов каша торт соус '
+          'запеканка блины котлеты').split()
+PARETO_ALPHA = 1.5
+ZIPF_EXPONENT = 1.1
+
+
+def skewed_count(rng, mean, limit):
+    # Pareto(1.5) has a mean of 3, rescale it to the requested mean
+    value = rng.paretovariate(PARETO_ALPHA) * mean / 3
+    return min(int(value), limit)
+
+
+def zipf_weights(size):
+    return list(accumulate(1 / rank ** ZIPF_EXPONENT
+                           for rank in range(1, size + 1)))
+
+
+def pick_distinct(rng, population, cum_weights, count, exclude=None):
+    available = len(population) - (exclude is not None)
+    count = min(count, available)
+    if count * 2 > available:
+        # weighted rejection sampling crawls once most of the population
+        # has to be picked, fall back to a uniform sample
+        return set(rng.sample(
+            [item for item in population if item != exclude], count))
+    picked = set()
+    while len(picked) < count:
+        for item in rng.choices(population, cum_weights=cum_weights,
+                                k=count - len(picked)):
+            if item != exclude:
+                picked.add(item)
+    return picked
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетические данные для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes-per-user', type=float, default=5)
+        parser.add_argument('--subscriptions', type=float, default=10)
+        parser.add_argument('--favorites', type=float, default=20)
+        parser.add_argument('--cart-size', type=float, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--prefix', default='load')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'нет ингредиентов, сначала выполните importcsv')
+        self.ingredients = ingredient_ids
+        self.ingredient_weights = zipf_weights(len(ingredient_ids))
+        self.rng.shuffle(self.ingredients)
+        self.tags = self.get_tags()
+
+        started = time.monotonic()
+        users = self.create_users(options['users'], options['prefix'])
+        recipes = self.create_recipes(users, options['recipes_per_user'])
+        self.create_recipe_relations(recipes)
+        # authors and recipes are ranked in random order so popularity
+        # does not correlate with ids
+        authors = list(users)
+        self.rng.shuffle(authors)
+        self.link(User.subscriptions.through, 'from_user_id', 'to_user_id',
+                  users, authors, options['subscriptions'], exclude_self=True)
+        popular = list(recipes)
+        self.rng.shuffle(popular)
+        self.link(User.favorite_recipes.through, 'user_id', 'recipe_id',
+                  users, popular, options['favorites'])
+        self.link(User.shopping_cart.through, 'user_id', 'recipe_id',
+                  users, popular, options['cart_size'])
+        # bulk_create bypasses the m2m_changed handlers
+        reconcile_counters()
+        rebuild_shopping_carts()
+        call_command('rebuildfeeds', stdout=self.stdout)
+        invalidate_responses(['recipe-list', 'recipe-favorites'])
+        self.stdout.write(f'done in {time.monotonic() - started:.1f}s')
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def bulk_insert(self, model, objects):
+        objects = iter(objects)
+        created = []
+        with transaction.atomic():
+            while batch := list(islice(objects, self.batch_size)):
+                created.extend(
+                    obj.pk for obj in model.objects.bulk_create(batch))
+                self.stdout.write(f'\r{model._meta.db_table}: '
+                                  f'{len(created)} rows', ending='')
+                self.stdout.flush()
+        self.stdout.write('')
+        return created
+
+    def create_users(self, count, prefix):
+        password = make_password('password')
+        first = User.objects.filter(
+            username__startswith=f'{prefix}_').count()
+        users = self.bulk_insert(User, (
+            User(username=f'{prefix}_{number}',
+                 email=f'{prefix}_{number}@load.testmail',
+                 first_name=f'Имя{number}',
+                 last_name=f'Фамилия{number}',
+                 password=password)
+            for number in range(first, first + count)
+        ))
+        return users
+
+    def create_recipes(self, users, recipes_per_user):
+        rng = self.rng
+
+        def recipes():
+            for author_id in users:
+                for _ in range(skewed_count(rng, recipes_per_user,
+                                            int(recipes_per_user * 50))):
+                    yield Recipe(
+                        author_id=author_id,
+                        name=(f'{rng.choice(WORDS)} {rng.choice(DISHES)} '
+                              f'№{rng.randint(1, 10 ** 6)}'),
+                        text=' '.join(rng.choices(WORDS + DISHES, k=60)),
+                        cooking_time=rng.randint(1, 180),
+                        image=rng.choice(IMAGES))
+
+        return self.bulk_insert(Recipe, recipes())
+
+    def create_recipe_relations(self, recipes):
+        rng = self.rng
+
+        def ingredients():
+            for recipe_id in recipes:
+                for ingredient_id in pick_distinct(
+                        rng, self.ingredients, self.ingredient_weights,
+                        rng.randint(2, 12)):
+                    yield IngredientInRecipe(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 1000))
+
+        def tags():
+            for recipe_id in recipes:
+                for tag_id in rng.sample(self.tags,
+                                         rng.randint(1, min(3, len(
+                                             self.tags)))):
+                    yield Recipe.tags.through(recipe_id=recipe_id,
+                                              tag_id=tag_id)
+
+        self.bulk_insert(IngredientInRecipe, ingredients())
+        self.bulk_insert(Recipe.tags.through, tags())
+
+    def link(self, through, source, target, sources, targets, mean,
+             exclude_self=False):
+        if not targets or not mean:
+            return
+        rng = self.rng
+        weights = zipf_weights(len(targets))
+
+        def rows():
+            for source_id in sources:
+                count = skewed_count(rng, mean, len(targets))
+                for target_id in pick_distinct(
+                        rng, targets, weights, count,
+                        exclude=source_id if exclude_self else None):
+                    yield through(**{source: source_id, target: target_id})
+
+        self.bulk_insert(through, rows())
@@ -1,25 +1,109 @@
 import csv
+import io
+import json
+import time
+from itertools import islice
 from os.path import dirname, join, normcase
+
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db.utils import IntegrityError
+from django.db import connection, transaction
 
+from api.caching import bump_catalog_version
+from recipes.catalog import deferred_rebuild
 from recipes.models import Ingredient
 
-CSV_FILE = join(
-    dirname(dirname(settings.BASE_DIR)),
-    normcase('data/ingredients.csv')
-)
+DATA_DIR = join(dirname(dirname(settings.BASE_DIR)), normcase('data'))
+FIELDNAMES = ['name', 'measurement_unit']
+
+
+def read_csv(path):
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        yield from csv.DictReader(csvfile, fieldnames=FIELDNAMES)
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as jsonfile:
+        yield from json.load(jsonfile)
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def batches(rows, batch_size):
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
 
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из data/ingredients.csv или .json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=READERS, default='csv')
+        parser.add_argument('--file', default=None)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
     def handle(self, *args, **options):
-        with open(CSV_FILE, 'r', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['name', 'measurement_unit']
-            reader = csv.DictReader(csvfile, fieldnames=fieldnames)
-            for row in reader:
-                try:
-                    ingredient = Ingredient(**row)
-                    ingredient.save()
-                except IntegrityError as e:
-                    print(e)
+        path = options['file'] or join(
+            DATA_DIR, f'ingredients.{options["format"]}')
+        rows = (
+            (row['name'], row['measurement_unit'])
+            for row in READERS[options['format']](path)
+        )
+        if connection.vendor == 'postgresql':
+            load = self.copy_rows
+        else:
+            load = self.bulk_create_rows
+        started = time.monotonic()
+        with deferred_rebuild():
+            count_before = Ingredient.objects.count()
+            total = load(batches(rows, options['batch_size']))
+            created = Ingredient.objects.count() - count_before
+        bump_catalog_version('ingredients')
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'\n{total} rows read, {created} ingredients created '
+            f'in {elapsed:.2f}s ({total / max(elapsed, 1e-6):.0f} rows/s)'
+        )
+
+    def progress(self, total):
+        self.stdout.write(f'\r{total} rows loaded', ending='')
+        self.stdout.flush()
+
+    def bulk_create_rows(self, batches):
+        total = 0
+        for batch in batches:
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch],
+                ignore_conflicts=True)
+            total += len(batch)
+            self.progress(total)
+        return total
+
+    def copy_rows(self, batches):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        total = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP')
+            for batch in batches:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_import (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)', buffer)
+                total += len(batch)
+                self.progress(total)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import ON CONFLICT DO NOTHING')
+        return total
@@ -0,0 +1,52 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from recipes.models import ImageTask, Recipe
+from recipes.workers import drain
+
+
+class Command(BaseCommand):
+    help = ('Пересоздает уменьшенные копии иллюстраций всех рецептов '
+            'и обрабатывает очередь')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=os.cpu_count() or 1)
+        parser.add_argument('--pending-only', action='store_true',
+                            help='только обработать уже поставленные задачи')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if not options['pending_only']:
+            self.enqueue_all(options['batch_size'])
+        processes = max(options['processes'], 1)
+        # forked children must not share the parent's connections
+        connections.close_all()
+        with ProcessPoolExecutor(processes) as executor:
+            futures = [executor.submit(drain, [ImageTask])
+                       for _ in range(processes)]
+            processed = sum(future.result() for future in futures)
+        left = ImageTask.objects.count()
+        self.stdout.write(
+            f'{processed} images processed by {processes} processes '
+            f'in {time.monotonic() - started:.1f}s, {left} left in queue')
+
+    def enqueue_all(self, batch_size):
+        now = timezone.now()
+        recipe_ids = Recipe.objects.exclude(image__isnull=True).exclude(
+            image='').values_list('pk', flat=True).iterator()
+        total = 0
+        while batch := list(islice(recipe_ids, batch_size)):
+            # recipes that already have a task keep it
+            ImageTask.objects.bulk_create(
+                [ImageTask(recipe_id=pk, enqueued_at=now) for pk in batch],
+                ignore_conflicts=True)
+            total += len(batch)
+        self.stdout.write(f'{total} recipes queued')
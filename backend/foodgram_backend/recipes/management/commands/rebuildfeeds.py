@@ -0,0 +1,40 @@
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from recipes.feed import Subscription, pulled_authors, rebuild_timelines
+from recipes.models import FeedTask, Recipe, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает ленты подписок, например после generatedata '
+            'или изменения FEED_LENGTH')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        up_to = Recipe.objects.aggregate(last=Max('id'))['last'] or 0
+        excluded = pulled_authors()
+        TimelineEntry.objects.exclude(
+            user__in=Subscription.objects.values('from_user')).delete()
+        user_ids = Subscription.objects.values_list(
+            'from_user_id', flat=True).distinct().order_by(
+            'from_user_id').iterator()
+        total = 0
+        while batch := list(islice(user_ids, options['batch_size'])):
+            rebuild_timelines(batch, up_to, excluded)
+            total += len(batch)
+            self.stdout.write(f'\r{total} timelines rebuilt', ending='')
+            self.stdout.flush()
+        # only now that the timelines hold them can these stop being pulled
+        pushed = Recipe.objects.filter(
+            pk__lte=up_to, feed_pushed=False
+        ).exclude(author__in=excluded).update(feed_pushed=True)
+        FeedTask.objects.filter(recipe_id__lte=up_to).delete()
+        self.stdout.write(
+            f'\n{pushed} recipes marked as pushed, {len(excluded)} authors '
+            f'left to pull, done in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.caching import invalidate_responses
+from recipes.carts import rebuild_shopping_carts
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики избранного и списков покупок '
+            'и итоги списков покупок')
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters()
+        for field, fixed in drift.items():
+            self.stdout.write(f'{field}: {fixed} recipes fixed')
+        if drift['favorites_count']:
+            invalidate_responses(['recipe-favorites'])
+        rebuild_shopping_carts()
+        self.stdout.write('shopping cart totals rebuilt')
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    User = apps.get_model('users', 'User')
+    relations = {
+        'favorites_count': User._meta.get_field(
+            'favorite_recipes').remote_field.through,
+        'shopping_carts_count': User._meta.get_field(
+            'shopping_cart').remote_field.through,
+    }
+    for field, through in relations.items():
+        Recipe.objects.update(**{field: Coalesce(Subquery(
+            through.objects.filter(recipe=OuterRef('pk'))
+            .values('recipe').annotate(total=Count('*')).values('total')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_updated_at'),
+        ('users', '0007_alter_user_favorite_recipes_alter_user_shopping_cart_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='в избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='в списках покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
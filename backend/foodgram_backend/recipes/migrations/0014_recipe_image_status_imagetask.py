@@ -0,0 +1,33 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'готова'), ('pending', 'обрабатывается'), ('failed', 'ошибка обработки')], default='ready', max_length=16, verbose_name='состояние иллюстрации'),
+        ),
+        migrations.CreateModel(
+            name='ImageTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enqueued_at', models.DateTimeField(verbose_name='поставлена в очередь')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='захвачена до')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='попытки')),
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='image_task', to='recipes.recipe', verbose_name='рецепт')),
+            ],
+            options={
+                'verbose_name': 'обработка иллюстрации',
+                'verbose_name_plural': 'очередь обработки иллюстраций',
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -37,6 +38,7 @@ class Tag (models.Model):
         verbose_name='цвет')
     slug = models.SlugField(
         max_length=200,
+        unique=True,
         verbose_name='ссылка')
 
     class Meta:
@@ -48,6 +50,15 @@ class Tag (models.Model):
 
 
 class Recipe(models.Model):
+    IMAGE_READY = 'ready'
+    IMAGE_PENDING = 'pending'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = [
+        (IMAGE_READY, 'готова'),
+        (IMAGE_PENDING, 'обрабатывается'),
+        (IMAGE_FAILED, 'ошибка обработки'),
+    ]
+
     name = models.CharField(
         max_length=200,
         verbose_name='название')
@@ -61,6 +72,16 @@ class Recipe(models.Model):
         null=True,
         default=None,
         verbose_name='иллюстрация')
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='уменьшенные копии иллюстрации')
+    image_status = models.CharField(
+        max_length=16,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+        verbose_name='состояние иллюстрации')
     tags = models.ManyToManyField(
         Tag,
         related_name='recipes',
@@ -68,14 +89,37 @@ class Recipe(models.Model):
     text = models.TextField(verbose_name='текст')
     cooking_time = models.PositiveIntegerField(
         verbose_name='время приготовления')
-
-    @property
-    def favored_counter(self):
-        return self.favored_by.count()
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='дата изменения')
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='в избранном')
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='в списках покупок')
+    # set once the recipe has been pushed into its followers' timelines,
+    # until then (and for authors with too many followers) feeds pull it
+    feed_pushed = models.BooleanField(
+        default=False,
+        verbose_name='разослан в ленты')
+    # filled by a database trigger on PostgreSQL, see recipes.search
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='поисковый вектор')
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
+        indexes = [
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_popularity_idx'),
+            models.Index(fields=['author', '-id'],
+                         condition=models.Q(feed_pushed=False),
+                         name='recipe_feed_pull_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -104,3 +148,93 @@ class IngredientInRecipe(models.Model):
                 fields=['recipe', 'ingredient'],
                 name='unique_recipe_ingredient')
         ]
+
+
+class ShoppingCartItem(models.Model):
+    # per-user ingredient totals over the shopping cart, kept up to date
+    # by recipes.carts so the cart never has to be aggregated on read
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_items',
+        verbose_name='пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='ингредиент')
+    total = models.PositiveIntegerField(verbose_name='количество')
+
+    class Meta:
+        verbose_name = 'позиция списка покупок'
+        verbose_name_plural = 'позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_item')
+        ]
+
+
+class QueuedTask(models.Model):
+    # one pending job per recipe, processed by recipes.workers
+    enqueued_at = models.DateTimeField(verbose_name='поставлена в очередь')
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='захвачена до')
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='попытки')
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class ImageTask(QueuedTask):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_task',
+        verbose_name='рецепт')
+
+    class Meta:
+        verbose_name = 'обработка иллюстрации'
+        verbose_name_plural = 'очередь обработки иллюстраций'
+
+
+class FeedTask(QueuedTask):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_task',
+        verbose_name='рецепт')
+
+    class Meta:
+        verbose_name = 'рассылка в ленты'
+        verbose_name_plural = 'очередь рассылки в ленты'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='читатель')
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='рецепт')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи лент'
+        # also the index the feed is read from, newest recipe first
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry')
+        ]
@@ -0,0 +1,80 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+# SQLite (DEBUG) uses an external content FTS5 table kept in sync by
+# triggers. SQLite migrations rebuild tables on most schema changes, which
+# drops the triggers, so this is (re)applied after every migrate instead
+# of living in a migration; see recipes.signals.
+SQLITE_SETUP = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text, content='recipes_recipe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def setup_sqlite_index(connection):
+    with connection.cursor() as cursor:
+        for statement in SQLITE_SETUP:
+            cursor.execute(statement)
+
+
+def fts5_query(text):
+    # FTS5 has no Russian stemmer, every word is matched as a prefix
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def search_recipes(queryset, text):
+    # adds search_rank, higher is more relevant
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+    match = fts5_query(text)
+    if not match:
+        # no words to look for, the rank still has to exist for ordering
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())).none()
+    # the FTS table is joined once on rowid, a correlated subquery would
+    # run MATCH and bm25() again for every candidate row
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = "{table}"."id"',
+               f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+    ).annotate(search_rank=RawSQL(
+        f'-bm25({FTS_TABLE}, 10.0, 1.0)', (), output_field=FloatField()))
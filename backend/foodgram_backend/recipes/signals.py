@@ -0,0 +1,131 @@
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from .carts import add_to_carts, cart_users, remove_from_carts
+from .catalog import build_catalog, rebuild_deferred
+from .counters import change_counter, counted_relations
+from .feed import follow, unfollow
+from .models import FeedTask, Ingredient, Recipe, TimelineEntry
+from .search import setup_sqlite_index
+from .workers import enqueue
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def rebuild_ingredient_catalog(sender, **kwargs):
+    if not rebuild_deferred():
+        transaction.on_commit(build_catalog)
+
+
+def lock_recipes(recipe_ids):
+    # The counter updates lock these rows anyway. Taking the locks before
+    # the rows of the relation are read makes concurrent changes of the
+    # same recipes wait for each other instead of counting a row twice.
+    list(Recipe.objects.select_for_update().filter(
+        pk__in=recipe_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def changed_ids(through, instance, action, reverse, pk_set):
+    # add() and remove() send the ids that were asked for, which may be
+    # there already or gone by now, and clear() sends none at all. What
+    # actually changes is read in pre_* and returned in post_*.
+    if reverse:
+        owner, related = 'recipe', 'user_id'
+    else:
+        owner, related = 'user', 'recipe_id'
+    pending = instance.__dict__.setdefault('_changed_ids', {})
+    if action.startswith('pre_'):
+        rows = through.objects.filter(**{owner: instance})
+        if action == 'pre_clear':
+            pk_set = set(rows.values_list(related, flat=True))
+        lock_recipes([instance.pk] if reverse else pk_set)
+        if action != 'pre_clear':
+            rows = rows.filter(**{f'{related}__in': pk_set})
+        existing = set(rows.values_list(related, flat=True))
+        pending[through] = (set(pk_set) - existing if action == 'pre_add'
+                            else existing)
+        return None
+    return pending.pop(through, None)
+
+
+def count_changes(field, instance, action, reverse, ids):
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        change_counter(field, [instance.pk], delta * len(ids))
+    else:
+        change_counter(field, ids, delta)
+
+
+@receiver(m2m_changed, sender=User.favorite_recipes.through)
+def sync_favorites(sender, instance, action, reverse, pk_set, **kwargs):
+    ids = changed_ids(sender, instance, action, reverse, pk_set)
+    if ids:
+        count_changes('favorites_count', instance, action, reverse, ids)
+
+
+@receiver(m2m_changed, sender=User.shopping_cart.through)
+def sync_shopping_cart(sender, instance, action, reverse, pk_set,
+                       **kwargs):
+    ids = changed_ids(sender, instance, action, reverse, pk_set)
+    if not ids:
+        return
+    count_changes('shopping_carts_count', instance, action, reverse, ids)
+    change = add_to_carts if action == 'post_add' else remove_from_carts
+    if reverse:
+        change(ids, [instance.pk])
+    else:
+        change([instance.pk], ids)
+
+
+@receiver(pre_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    # the cascade deletes the user's favorites and cart without sending
+    # m2m_changed; the user's own cart totals go with the cascade
+    for field, through in counted_relations().items():
+        change_counter(field, list(through.objects.filter(
+            user=instance).values_list('recipe_id', flat=True)), -1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_carts(sender, instance, **kwargs):
+    remove_from_carts(cart_users(instance.pk), [instance.pk])
+
+
+@receiver(post_migrate)
+def setup_search_index(sender, using, **kwargs):
+    connection = connections[using]
+    if (sender.name == 'recipes' and connection.vendor == 'sqlite'
+            and Recipe._meta.db_table
+            in connection.introspection.table_names()):
+        setup_sqlite_index(connection)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, **kwargs):
+    if created:
+        enqueue(FeedTask, instance)
+
+
+@receiver(m2m_changed, sender=User.subscriptions.through)
+def sync_timelines(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_clear':
+        if reverse:
+            TimelineEntry.objects.filter(recipe__author=instance).delete()
+        else:
+            TimelineEntry.objects.filter(user=instance).delete()
+        return
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    if reverse:
+        user_ids, author_ids = pk_set, [instance.pk]
+    else:
+        user_ids, author_ids = [instance.pk], pk_set
+    if action == 'post_add':
+        follow(user_ids, author_ids)
+    else:
+        unfollow(user_ids, author_ids)
@@ -0,0 +1,74 @@
+from recipes.carts import rebuild_shopping_carts
+from recipes.models import ShoppingCartItem
+from recipes.tests.utils import (FoodgramTestCase, create_ingredient,
+                                 create_recipe, create_tag, create_user)
+
+
+class CartTotalsTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.users = [create_user(f'user{number}') for number in range(2)]
+        self.tag = create_tag('lunch')
+        self.flour = create_ingredient('мука')
+        self.milk = create_ingredient('молоко', 'мл')
+        self.eggs = create_ingredient('яйца', 'шт')
+        self.pancakes = create_recipe(
+            self.author, [(self.flour, 200), (self.milk, 500)], [self.tag])
+        self.bread = create_recipe(self.author, [(self.flour, 300)])
+
+    def totals(self, user):
+        return dict(ShoppingCartItem.objects.filter(user=user).values_list(
+            'ingredient__name', 'total'))
+
+    def assertRebuildAgrees(self):
+        totals = [self.totals(user) for user in self.users]
+        rebuild_shopping_carts()
+        self.assertEqual([self.totals(user) for user in self.users], totals)
+
+    def test_add_and_remove(self):
+        user = self.users[0]
+        self.client.force_authenticate(user)
+        for recipe in (self.pancakes, self.bread):
+            self.assertEqual(self.client.post(
+                f'/api/recipes/{recipe.pk}/shopping_cart/').status_code, 201)
+        self.assertEqual(self.totals(user), {'мука': 500, 'молоко': 500})
+        self.assertEqual(self.client.delete(
+            f'/api/recipes/{self.pancakes.pk}/shopping_cart/').status_code,
+            204)
+        self.assertEqual(self.totals(user), {'мука': 300})
+        self.assertEqual(self.totals(self.users[1]), {})
+        self.assertRebuildAgrees()
+
+    def test_recipe_update_changes_carts(self):
+        for user in self.users:
+            user.shopping_cart.add(self.pancakes, self.bread)
+        self.users[1].shopping_cart.remove(self.bread)
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(f'/api/recipes/{self.pancakes.pk}/', {
+            'name': 'блины', 'text': 'текст', 'cooking_time': 20,
+            'tags': [self.tag.pk],
+            'ingredients': [{'id': self.flour.pk, 'amount': 250},
+                            {'id': self.eggs.pk, 'amount': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(self.users[0]),
+                         {'мука': 550, 'яйца': 3})
+        self.assertEqual(self.totals(self.users[1]),
+                         {'мука': 250, 'яйца': 3})
+        self.assertRebuildAgrees()
+
+    def test_recipe_delete_empties_carts(self):
+        self.users[0].shopping_cart.add(self.pancakes, self.bread)
+        self.pancakes.delete()
+        self.assertEqual(self.totals(self.users[0]), {'мука': 300})
+        self.assertRebuildAgrees()
+
+    def test_export_shows_totals(self):
+        user = self.users[0]
+        user.shopping_cart.add(self.pancakes, self.bread)
+        self.client.force_authenticate(user)
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'csv'})
+        self.assertEqual(b''.join(response.streaming_content).decode()
+                         .splitlines()[1:], ['молоко,мл,500', 'мука,г,500'])
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from recipes import signals
+from recipes.counters import reconcile_counters
+from recipes.models import Recipe, ShoppingCartItem
+from recipes.tests.utils import (FoodgramTestCase, User, create_ingredient,
+                                 create_recipe, create_user)
+
+
+class CounterTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.users = [create_user(f'user{number}') for number in range(3)]
+        self.flour = create_ingredient('мука')
+        self.recipe = create_recipe(self.author, [(self.flour, 100)])
+        self.other = create_recipe(self.author, [(self.flour, 50)])
+
+    def assertCounters(self, recipe, favorites, carts):
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        self.assertEqual(
+            (recipe.favorites_count, recipe.shopping_carts_count),
+            (favorites, carts))
+
+    def assertNoDrift(self):
+        self.assertEqual(reconcile_counters(),
+                         {'favorites_count': 0, 'shopping_carts_count': 0})
+
+    def test_api_add_and_remove(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        for user in self.users[:2]:
+            self.client.force_authenticate(user)
+            self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertCounters(self.recipe, 2, 0)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertCounters(self.recipe, 1, 0)
+        self.assertNoDrift()
+
+    def test_repeated_add_and_remove(self):
+        user = self.users[0]
+        for _ in range(2):
+            user.favorite_recipes.add(self.recipe)
+            self.recipe.favored_by.add(user)
+        self.assertCounters(self.recipe, 1, 0)
+        self.recipe.favored_by.add(self.users[1])
+        for _ in range(2):
+            user.favorite_recipes.remove(self.recipe)
+            self.recipe.favored_by.remove(user)
+        self.assertCounters(self.recipe, 1, 0)
+        self.assertNoDrift()
+
+    def test_concurrent_add_counted_once(self):
+        user = self.users[0]
+        lock_recipes = signals.lock_recipes
+
+        def add_meanwhile(recipe_ids):
+            # another request adds the same recipe and commits while this
+            # one waits for the lock
+            lock_recipes(recipe_ids)
+            User.shopping_cart.through.objects.create(
+                user=user, recipe=self.recipe)
+
+        with mock.patch.object(signals, 'lock_recipes', add_meanwhile):
+            user.shopping_cart.add(self.recipe)
+        self.assertCounters(self.recipe, 0, 0)
+        self.assertFalse(ShoppingCartItem.objects.exists())
+        self.assertEqual(reconcile_counters()['shopping_carts_count'], 1)
+
+    def test_clear(self):
+        for user in self.users:
+            user.favorite_recipes.add(self.recipe, self.other)
+            user.shopping_cart.add(self.recipe)
+        self.users[0].favorite_recipes.clear()
+        self.assertCounters(self.recipe, 2, 3)
+        self.assertCounters(self.other, 2, 0)
+        self.recipe.shopping_carts.clear()
+        self.assertCounters(self.recipe, 2, 0)
+        self.assertFalse(ShoppingCartItem.objects.exists())
+        self.assertNoDrift()
+
+    def test_deleted_user(self):
+        for user in self.users:
+            user.favorite_recipes.add(self.recipe)
+            user.shopping_cart.add(self.recipe, self.other)
+        self.users[0].delete()
+        self.assertCounters(self.recipe, 2, 2)
+        self.assertCounters(self.other, 0, 2)
+        self.assertNoDrift()
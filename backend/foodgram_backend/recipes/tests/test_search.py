@@ -0,0 +1,52 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe
+from recipes.search import search_recipes
+from recipes.tests.utils import FoodgramTestCase, create_recipe, create_user
+
+
+class SearchTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.in_name = create_recipe(author, name='борщ')
+        self.in_text = create_recipe(author, name='суп')
+        Recipe.objects.filter(pk=self.in_text.pk).update(
+            text='почти как борщ')
+        self.other = create_recipe(author, name='каша')
+
+    def search(self, text):
+        return search_recipes(Recipe.objects.all(), text).order_by(
+            '-search_rank', '-id')
+
+    def test_matches_ranked_by_name_first(self):
+        self.assertEqual(list(self.search('борщ')),
+                         [self.in_name, self.in_text])
+        self.assertEqual(list(self.search('бор')),
+                         [self.in_name, self.in_text])
+
+    def test_rank_can_be_filtered_on(self):
+        rank = self.search('борщ').values_list(
+            'search_rank', flat=True)[0]
+        self.assertEqual(
+            list(self.search('борщ').filter(search_rank__lt=rank)),
+            [self.in_text])
+
+    def test_single_query_without_matches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(self.search('пельмени')), [])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(list(self.search('!!!')), [])
+        response = self.client.get('/api/recipes/', {'search': '!!!'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_cursor_pages(self):
+        response = self.client.get(
+            '/api/recipes/', {'search': 'борщ', 'cursor': '', 'limit': 1})
+        self.assertEqual([recipe['id'] for recipe in
+                          response.json()['results']], [self.in_name.pk])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual([recipe['id'] for recipe in
+                          response.json()['results']], [self.in_text.pk])
+        self.assertIsNone(response.json()['next'])
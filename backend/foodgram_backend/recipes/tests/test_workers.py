@@ -0,0 +1,84 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+
+from recipes import workers
+from recipes.models import FeedTask, Recipe, TimelineEntry
+from recipes.tests.utils import FoodgramTestCase, create_recipe, create_user
+
+
+# drain() closes the connection it ran on, which would break the test
+# transaction
+@mock.patch('recipes.workers.connection.close')
+class WorkerQueueTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        self.reader.subscriptions.add(self.author)
+        self.recipe = create_recipe(self.author)
+
+    def test_new_recipe_is_fanned_out(self, close):
+        self.assertTrue(FeedTask.objects.filter(recipe=self.recipe).exists())
+        self.assertEqual(workers.drain([FeedTask]), 1)
+        self.assertFalse(FeedTask.objects.exists())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, recipe=self.recipe).exists())
+        self.assertTrue(Recipe.objects.get(pk=self.recipe.pk).feed_pushed)
+        self.assertEqual(workers.drain([FeedTask]), 0)
+
+    def test_claimed_task_is_leased(self, close):
+        task = workers.claim_task(FeedTask)
+        self.assertEqual(task.attempts, 1)
+        self.assertIsNone(workers.claim_task(FeedTask))
+        FeedTask.objects.filter(pk=task.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(workers.claim_task(FeedTask).attempts, 2)
+
+    def test_enqueued_again_while_processing(self, close):
+        task = workers.claim_task(FeedTask)
+        workers.enqueue(FeedTask, self.recipe)
+        self.assertFalse(workers.finish_task(task))
+        self.assertTrue(FeedTask.objects.exists())
+        self.assertEqual(workers.drain([FeedTask]), 1)
+        self.assertFalse(FeedTask.objects.exists())
+
+    @override_settings(BACKGROUND_TASK_MAX_ATTEMPTS=2)
+    def test_failed_task_is_retried_then_dropped(self, close):
+        with mock.patch('recipes.workers.fan_out',
+                        side_effect=RuntimeError), \
+                self.assertLogs('foodgram.workers', 'ERROR'):
+            self.assertEqual(workers.drain([FeedTask]), 0)
+            self.assertTrue(FeedTask.objects.exists())
+            FeedTask.objects.update(locked_until=None)
+            self.assertEqual(workers.drain([FeedTask]), 0)
+        self.assertFalse(FeedTask.objects.exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+
+
+@mock.patch.object(workers.WorkerPool, 'run')
+class WorkerPoolTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(workers, 'pool', workers.WorkerPool())
+        self.pool = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(BACKGROUND_WORKERS=2)
+    def test_started_once_per_process(self, run):
+        self.client.get('/api/tags/')
+        self.client.get('/api/tags/')
+        self.assertEqual(len(self.pool.threads), 2)
+        threads = self.pool.threads
+        with mock.patch('recipes.workers.os.getpid', return_value=-1):
+            self.client.get('/api/tags/')
+        self.assertEqual(len(self.pool.threads), 2)
+        self.assertNotEqual(self.pool.threads, threads)
+        self.assertEqual(run.call_count, 4)
+
+    def test_no_threads_without_workers(self, run):
+        self.client.get('/api/tags/')
+        self.assertEqual(self.pool.threads, [])
+        run.assert_not_called()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+
+User = get_user_model()
+TEST_DIR = tempfile.mkdtemp(prefix='foodgram-tests-')
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'foodgram-tests',
+    }
+}
+
+
+def create_user(username, **kwargs):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password='Secret-password-1', first_name='Имя', last_name='Фамилия',
+        **kwargs)
+
+
+def create_ingredient(name, measurement_unit='г'):
+    return Ingredient.objects.create(
+        name=name, measurement_unit=measurement_unit)
+
+
+def create_tag(slug):
+    return Tag.objects.create(name=slug, color='#FF0000', slug=slug)
+
+
+def create_recipe(author, ingredients=(), tags=(), name='рецепт'):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='текст', cooking_time=10)
+    recipe.tags.set(tags)
+    for ingredient, amount in ingredients:
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=amount)
+    return recipe
+
+
+@override_settings(
+    CACHES=TEST_CACHES, MEDIA_ROOT=TEST_DIR, BACKGROUND_WORKERS=0,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    INGREDIENT_CATALOG_PATH=os.path.join(TEST_DIR, 'ingredient_catalog.bin'))
+class FoodgramTestCase(APITestCase):
+    # every test starts with empty caches, versions and cached responses
+    # are kept there
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
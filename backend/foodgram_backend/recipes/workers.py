@@ -0,0 +1,165 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .feed import fan_out
+from .images import delete_variants, render_variants
+from .models import FeedTask, ImageTask, Recipe
+
+logger = logging.getLogger('foodgram.workers')
+
+
+def enqueue(task_model, recipe):
+    # the queue row is what makes the work durable, the pool is only woken
+    # up and will also pick up rows left behind by a dead process
+    task_model.objects.update_or_create(recipe=recipe, defaults={
+        'enqueued_at': timezone.now(),
+        'locked_until': None,
+        'attempts': 0,
+    })
+    transaction.on_commit(pool.notify)
+
+
+def claim_task(task_model):
+    now = timezone.now()
+    available = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    candidates = task_model.objects.filter(available).order_by(
+        'enqueued_at').values_list('pk', 'enqueued_at')[:10]
+    for pk, enqueued_at in candidates:
+        # a conditional UPDATE is enough to claim a row on every backend,
+        # whoever loses the race simply moves on to the next candidate
+        claimed = task_model.objects.filter(
+            available, pk=pk, enqueued_at=enqueued_at
+        ).update(
+            locked_until=now + timedelta(
+                seconds=settings.BACKGROUND_TASK_LEASE),
+            attempts=F('attempts') + 1)
+        if claimed:
+            return task_model.objects.select_related('recipe').get(pk=pk)
+    return None
+
+
+def finish_task(task):
+    # False if the task was enqueued again while it was being processed
+    deleted, _ = type(task).objects.filter(
+        pk=task.pk, enqueued_at=task.enqueued_at).delete()
+    return bool(deleted)
+
+
+def task_failed(task):
+    logger.exception('%s failed for recipe %s', type(task).__name__,
+                     task.recipe_id)
+    # otherwise the task is retried once its lease runs out
+    return task.attempts >= settings.BACKGROUND_TASK_MAX_ATTEMPTS
+
+
+def process_image_task(task):
+    recipe = task.recipe
+    try:
+        variants = render_variants(recipe.image) if recipe.image else {}
+    except Exception:
+        if task_failed(task):
+            with transaction.atomic():
+                finish_task(task)
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    image_status=Recipe.IMAGE_FAILED)
+        return False
+    with transaction.atomic():
+        if not finish_task(task):
+            # the image was replaced while this one was being processed,
+            # the newer task takes over
+            transaction.on_commit(lambda: delete_variants(variants))
+            return False
+        previous = recipe.image_variants
+        recipe.image_variants = variants
+        recipe.image_status = Recipe.IMAGE_READY
+        recipe.save(update_fields=['image_variants', 'image_status',
+                                   'updated_at'])
+        transaction.on_commit(lambda: delete_variants(previous))
+    return True
+
+
+def process_feed_task(task):
+    try:
+        fan_out(task.recipe)
+    except Exception:
+        # a recipe that is never pushed is still pulled by the feeds
+        if task_failed(task):
+            finish_task(task)
+        return False
+    finish_task(task)
+    return True
+
+
+PROCESSORS = {
+    FeedTask: process_feed_task,
+    ImageTask: process_image_task,
+}
+
+
+def drain(task_models=None):
+    processed = 0
+    try:
+        for task_model in task_models or PROCESSORS:
+            while (task := claim_task(task_model)) is not None:
+                processed += PROCESSORS[task_model](task)
+    finally:
+        connection.close()
+    return processed
+
+
+class WorkerPool:
+    def __init__(self, size=None):
+        self.size = size
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.pid = None
+
+    def start(self):
+        # threads do not survive a fork, a process forked from one that
+        # already started the pool starts its own
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                size = (settings.BACKGROUND_WORKERS if self.size is None
+                        else self.size)
+                self.threads = [
+                    threading.Thread(target=self.run, daemon=True,
+                                     name=f'background-worker-{number}')
+                    for number in range(size)
+                ]
+                for thread in self.threads:
+                    thread.start()
+        self.notify()
+
+    def notify(self):
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            # the timeout doubles as a sweep for expired leases
+            self.wakeup.wait(timeout=settings.BACKGROUND_TASK_LEASE)
+            self.wakeup.clear()
+            try:
+                drain()
+            except Exception:
+                logger.exception('background worker failed')
+
+
+pool = WorkerPool()
+
+
+def start_pool(sender, **kwargs):
+    # Connected to request_started, so that every process that serves
+    # requests runs the pool whatever the server, WSGI or ASGI, and
+    # whether it preloads the application before forking. Management
+    # commands leave their tasks in the queue.
+    if pool.pid != os.getpid():
+        pool.start()